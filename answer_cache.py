@@ -0,0 +1,93 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from storage import execute_sql
+
+def normalize_question(message):
+    """Lowercases and strips punctuation/extra whitespace so trivially different phrasings share an entry."""
+    return " ".join(re.findall(r"[a-z0-9_]+(?:\.[a-z0-9_]+)*", message.lower()))
+
+class AnswerCache:
+    """
+    LRU + TTL cache of chat replies keyed by normalized question and CVOT version.
+    With a db_path, entries are also written to SQLite so they survive restarts.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created_at, reply)
+        self._lock = threading.Lock()
+        if db_path:
+            self._db("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, version TEXT, created_at REAL, reply TEXT)")
+
+    def _db(self, sql, params=()):
+        """Runs one statement against the SQLite store and returns the first row, if any."""
+        rows = execute_sql(self.db_path, sql, params, timeout=5)
+        return rows[0] if rows else None
+
+    def _key(self, message):
+        return hashlib.sha256(f"{self.version}\0{normalize_question(message)}".encode("utf-8")).hexdigest()
+
+    def set_version(self, version):
+        """Binds the cache to a CVOT version, dropping answers computed against any other version."""
+        with self._lock:
+            if version == self.version: return
+            self.version = version
+            self._entries.clear()
+            if self.db_path:
+                self._db("DELETE FROM answers WHERE version != ?", (version,))
+
+    def get(self, message):
+        """Returns the cached reply or None, counting the lookup as a hit or miss."""
+        now = time.time()
+        with self._lock:
+            key = self._key(message)
+            entry = self._entries.get(key)
+            if entry is None and self.db_path:
+                row = self._db("SELECT created_at, reply FROM answers WHERE key = ?", (key,))
+                if row:
+                    entry = self._store(key, row[0], row[1])
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, message, reply, version=None):
+        """Stores a reply; replies computed against an older CVOT version than the current one are dropped."""
+        now = time.time()
+        with self._lock:
+            if version is not None and version != self.version: return
+            key = self._key(message)
+            self._store(key, now, reply)
+            if self.db_path:
+                self._db("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)", (key, self.version, now, reply))
+                self._db("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+
+    def _store(self, key, created_at, reply):
+        entry = (created_at, reply)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "version": self.version, "persistent": bool(self.db_path),
+            }
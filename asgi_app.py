@@ -0,0 +1,162 @@
+import os
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import anthropic
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+import main
+
+# --- Configuration ---
+# Run with: uvicorn asgi_app:app --port 5001
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # In-flight Anthropic calls
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))  # Chats allowed to wait for a free slot
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # Seconds a queued chat waits before 503
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", str(LLM_MAX_CONCURRENCY)))
+
+BUSY_REPLY = "The assistant is busy right now. Please try again in a moment."
+
+class LLMBusyError(Exception):
+    """Raised when the chat queue is full or a queued chat waited too long for a slot."""
+
+class LLMGate:
+    """Bounds in-flight LLM calls with a semaphore and a finite, time-limited wait queue."""
+
+    def __init__(self, max_concurrency, queue_size, queue_timeout):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+
+    async def acquire(self):
+        """Takes a slot, raising LLMBusyError instead of queueing without bound."""
+        if self.semaphore.locked() and self.waiting >= self.queue_size:
+            raise LLMBusyError("queue full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError("timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self.semaphore.release()
+
+@asynccontextmanager
+async def lifespan(app):
+    """Creates one pooled HTTP connection and async Anthropic client shared by all chats."""
+    # The SDK's own client class, so it matches whichever httpx package the installed SDK is built on
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        timeout=anthropic.Timeout(600.0, connect=5.0),
+    )
+    app.state.client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), base_url=os.getenv("ANTHROPIC_BASE_URL"),
+                                                http_client=http_client)
+    app.state.gate = LLMGate(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+    try:
+        yield
+    finally:
+        await app.state.client.close()
+
+app = FastAPI(lifespan=lifespan)
+
+def busy_response(e):
+    print(f"Rejecting chat request: {e}")
+    return JSONResponse({"reply": BUSY_REPLY}, status_code=503, headers={"Retry-After": "5"})
+
+async def read_user_message(request):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return None
+    return body.get("message") if isinstance(body, dict) else None
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    """Async version of main.chat(); the event loop stays free while the LLM answers."""
+    user_message = await read_user_message(request)
+    if not user_message:
+        return JSONResponse({"reply": "Invalid message received."}, status_code=400)
+
+    cached_reply = main.answer_cache.get(user_message)
+    if cached_reply is not None:
+        return JSONResponse({"reply": cached_reply, "cached": True})
+
+    chat_kwargs, context_stats = main.build_chat_request(user_message)
+    gate = request.app.state.gate
+    try:
+        await gate.acquire()
+    except LLMBusyError as e:
+        return busy_response(e)
+    try:
+        response = await request.app.state.client.messages.create(**chat_kwargs)
+        main.log_prompt_cache_usage(response.usage)
+        reply = response.content[0].text
+        main.answer_cache.put(user_message, reply, context_stats["cvot_version"])
+        return JSONResponse({"reply": reply, "context": context_stats})
+    except Exception as e:
+        print(f"Error calling Anthropic API: {e}")
+        return JSONResponse({"reply": "Sorry, I'm having trouble connecting to my brain right now."}, status_code=500)
+    finally:
+        gate.release()
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: Request):
+    """Async version of main.chat_stream(); the slot is held until the stream ends or the client leaves."""
+    user_message = await read_user_message(request)
+    if not user_message:
+        return JSONResponse({"reply": "Invalid message received."}, status_code=400)
+
+    cached_reply = main.answer_cache.get(user_message)
+    if cached_reply is not None:
+        body = main.format_sse("delta", {"text": cached_reply}) + main.format_sse("done", {"cached": True})
+        return StreamingResponse(iter([body]), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    chat_kwargs, context_stats = main.build_chat_request(user_message)
+    gate = request.app.state.gate
+    try:
+        await gate.acquire()
+    except LLMBusyError as e:
+        return busy_response(e)
+
+    async def generate():
+        completed = False
+        parts = []
+        try:
+            yield main.format_sse("context", context_stats)
+            # Starlette cancels this generator when the client disconnects, which exits the
+            # async with-block and closes the upstream stream
+            async with request.app.state.client.messages.stream(**chat_kwargs) as stream:
+                async for text in stream.text_stream:
+                    parts.append(text)
+                    yield main.format_sse("delta", {"text": text})
+                main.log_prompt_cache_usage((await stream.get_final_message()).usage)
+            completed = True
+            main.answer_cache.put(user_message, "".join(parts), context_stats["cvot_version"])
+            yield main.format_sse("done", {})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error streaming from Anthropic API: {e}")
+            completed = True
+            yield main.format_sse("error", {"reply": "Sorry, I'm having trouble connecting to my brain right now."})
+        finally:
+            gate.release()
+            if not completed:
+                print("Chat stream closed by client; cancelled upstream generation.")
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Every other route (/, /api/cvot, /api/diagnosis/...) is served by the existing Flask app
+# in the WSGI thread pool, so it keeps responding while chats wait on the LLM
+app.mount("/", WSGIMiddleware(main.app))
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=5001)
@@ -0,0 +1,206 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+from storage import atomic_write
+
+# --- Configuration ---
+BLOB_DIR = "blobs"  # Content-addressed store for section source text
+
+# --- Content-Addressed Blob Store ---
+
+def _blob_path(digest, blob_dir):
+    return os.path.join(blob_dir, digest[:2], f"{digest}.txt")
+
+def put_blob(text, blob_dir=BLOB_DIR):
+    """Stores text under its SHA-256 and returns the digest; identical text is stored once."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    path = _blob_path(digest, blob_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(text)
+    return digest
+
+def get_blob(digest, blob_dir=BLOB_DIR):
+    with open(_blob_path(digest, blob_dir), 'r', encoding="utf-8") as f:
+        return f.read()
+
+# --- Append-Only JSONL Checkpoint ---
+
+def repair_checkpoint(path):
+    """Drops a partially written last line (e.g. after a crash mid-append) so appends stay line-aligned."""
+    if not os.path.exists(path): return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0: return
+        f.seek(size - 1)
+        if f.read(1) == b"\n": return
+        # Walk back to the last complete line
+        position = size - 1
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        print(f"  - WARNING: Dropping truncated last record from {path} ({size - position} bytes).")
+        f.truncate(position)
+
+def append_record(path, record):
+    """Appends one record as a JSON line and fsyncs it, so a completed section survives a crash."""
+    append_records(path, [record])
+
+def append_records(path, records):
+    """Appends several records with a single fsync."""
+    with open(path, 'a', encoding="utf-8") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+def iter_records(path):
+    """Yields records one at a time, skipping a truncated or corrupt line instead of failing."""
+    if not os.path.exists(path): return
+    with open(path, 'r', encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip(): continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  - WARNING: Skipping unreadable record on line {line_number} of {path}.")
+
+def record_key(record):
+    """Records are identified by source document and section title; legacy records have no document."""
+    return (record.get("doc"), record["title"])
+
+def load_records(path):
+    """Loads all records, keeping only the latest one per document section."""
+    latest = {}
+    for record in iter_records(path):
+        latest.pop(record_key(record), None)
+        latest[record_key(record)] = record
+    return list(latest.values())
+
+def index_records(path):
+    """
+    Maps each (doc, title) key to (byte offset, section_hash) of its latest record, without keeping
+    records in memory.
+    """
+    index = {}
+    if not os.path.exists(path): return index
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+                index.pop(record_key(record), None)
+                index[record_key(record)] = (offset, record.get("section_hash"))
+            except (ValueError, KeyError):
+                pass  # Blank, truncated or corrupt line; iter_records() reports these
+            offset += len(line)
+    return index
+
+def iter_latest_records(path, order=None):
+    """
+    Streams the latest record per (doc, title) key, one at a time. With order, only the listed keys
+    are yielded, in that order, so sections dropped from the plan don't reach the CVOT.
+    """
+    index = index_records(path)
+    if not index: return
+    keys = [key for key in order if key in index] if order is not None else list(index)
+    with open(path, 'r', encoding="utf-8") as f:
+        for key in keys:
+            f.seek(index[key][0])
+            yield json.loads(f.readline())
+
+def assign_legacy_records(path, doc):
+    """Tags records written before multi-document ingestion with the document they came from, once."""
+    if not any(record.get("doc") is None for record in iter_records(path)): return
+    print(f"  - Assigning legacy checkpoint records to {doc}...")
+    with atomic_write(path, fsync=True) as f:
+        for record in iter_records(path):
+            f.write(json.dumps({"doc": doc, **record} if record.get("doc") is None else record) + "\n")
+
+def make_record(title, source_text, entities, relationships, blob_dir=BLOB_DIR, **fields):
+    """
+    Builds a checkpoint record, moving the (possibly very large) source text into the blob store.
+    Extra fields (e.g. doc, section_hash) are stored alongside the title.
+    """
+    return {
+        **fields,
+        "title": title,
+        "source_sha256": put_blob(source_text, blob_dir),
+        "source_chars": len(source_text),
+        "entities": entities,
+        "relationships": relationships,
+    }
+
+def migrate_legacy_checkpoint(legacy_path, path, blob_dir=BLOB_DIR):
+    """Converts a legacy intermediate_data.json list into the JSONL checkpoint, once."""
+    if os.path.exists(path) or not os.path.exists(legacy_path): return
+    with open(legacy_path, 'r') as f:
+        chunks = json.load(f)
+    print(f"  - Migrating {len(chunks)} sections from {legacy_path} to {path}...")
+    with atomic_write(path, fsync=True) as f:
+        for chunk in chunks:
+            record = make_record(chunk["title"], chunk.get("source_text", ""), chunk.get("entities", {}), chunk.get("relationships", {}), blob_dir)
+            f.write(json.dumps(record) + "\n")
+
+class SourceTextLookup:
+    """Maps source_key() -> source text, reading each blob only when a prompt first needs it."""
+
+    def __init__(self, digests, blob_dir=BLOB_DIR):
+        self.digests = digests
+        self.blob_dir = blob_dir
+        self._texts = {}
+
+    def get(self, title, default=None):
+        if title in self._texts: return self._texts[title]
+        digest = self.digests.get(title)
+        if digest is None: return default
+        try:
+            text = get_blob(digest, self.blob_dir)
+        except FileNotFoundError:
+            print(f"  - WARNING: Source text blob {digest[:12]} for '{title}' is missing.")
+            text = default
+        self._texts[title] = text
+        return text
+
+    def __contains__(self, title):
+        return title in self.digests
+
+def source_key(doc, title):
+    """Source text key of a section: 'doc::title', so same-named sections of different datasheets stay apart."""
+    return f"{doc}::{title}" if doc else title
+
+def load_source_text_lookup(path, legacy_path=None, blob_dir=BLOB_DIR):
+    """
+    Builds a lazy source_key() -> source text lookup from the checkpoint, falling back to a legacy JSON
+    file. A title that occurs in only one document can also be looked up on its own, for CVOTs whose
+    nodes predate source_doc.
+    """
+    if not os.path.exists(path) and legacy_path and os.path.exists(legacy_path):
+        with open(legacy_path, 'r') as f:
+            return {chunk['title']: chunk['source_text'] for chunk in json.load(f) if 'source_text' in chunk}
+    records = [record for record in load_records(path) if record.get("source_sha256")]
+    title_counts = Counter(record["title"] for record in records)
+    digests = {record["title"]: record["source_sha256"] for record in records if title_counts[record["title"]] == 1}
+    digests.update({source_key(record.get("doc"), record["title"]): record["source_sha256"] for record in records})
+    return SourceTextLookup(digests, blob_dir)
+
+# --- Per-Document Change Manifest ---
+
+def load_manifest(path):
+    """Loads the per-document page/section hash manifest written by the previous run, if any."""
+    if not os.path.exists(path): return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    with atomic_write(path) as f:
+        json.dump(manifest, f, indent=2)
@@ -0,0 +1,365 @@
+import heapq
+import html
+import json
+import math
+import re
+
+# --- Configuration ---
+REL_MAP = {
+    "indicator_to_error": {"from": "status_indicators", "to": "error_conditions"},
+    "error_to_cause": {"from": "error_conditions", "to": "root_causes"},
+    "cause_to_solution": {"from": "root_causes", "to": "solutions"},
+}
+SEED_NODE_TYPES = ["error_conditions", "status_indicators"]
+MAX_SEED_NODES = 8
+CHARS_PER_TOKEN = 4  # Rough estimate, good enough for budgeting prompt size
+
+# BM25 parameters and field weights for the node search index
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_FIELD_WEIGHTS = {"description": 1.0, "aliases": 0.8, "source_title": 0.3}  # aliases: descriptions merged by entity resolution
+SEARCH_EDGE_BOOST = 0.5  # How much a node's outgoing edge weight can lift its text score
+# Multi-hop diagnosis paths: each edge scores PATH_WEIGHT_SHARE * weight + the rest * confidence,
+# and a path scores the product of its edges
+PATH_LAYERS = ["indicator_to_error", "error_to_cause", "cause_to_solution"]
+PATH_WEIGHT_SHARE = 0.6
+PATH_CACHE_DEPTH = 50  # Paths kept per start node; queries for k beyond this are computed fresh
+TERM_PATTERN = re.compile(r"[a-z0-9_]+(?:\.[a-z0-9_]+)*", re.IGNORECASE)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "if", "in", "is", "it", "its", "my", "of", "on", "or", "should", "that", "the", "this",
+    "to", "was", "what", "when", "which", "why", "will", "with", "you",
+}
+
+# --- Helpers ---
+
+def estimate_tokens(text):
+    """Approximates the number of LLM tokens in a string."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def tokenize(text):
+    """Splits text into lowercase terms, keeping register names like 'DCDCSTS.INDDETECT' intact."""
+    terms = []
+    for raw in TERM_PATTERN.findall(text.lower()):
+        if raw in STOPWORDS: continue
+        terms.append(raw)
+        if "." in raw:
+            # Also index the parts so 'INDDETECT' alone still matches 'DCDCSTS.INDDETECT'
+            terms.extend(part for part in raw.split(".") if part)
+    return [term[:-1] if len(term) > 3 and term.endswith("s") and not term.endswith("ss") else term for term in terms]
+
+# --- Index Construction ---
+
+def build_graph_index(cvot):
+    """Builds id->node and from/to->[edges] lookups once so queries never rescan the graph."""
+    nodes_by_id = {}
+    for nodes in cvot.get("nodes", {}).values():
+        for node in nodes:
+            nodes_by_id[node["id"]] = node
+
+    edges_from = {rel_type: {} for rel_type in REL_MAP}
+    edges_to = {rel_type: {} for rel_type in REL_MAP}
+    for rel_type, vectors in cvot.get("causal_vectors", {}).items():
+        forward = edges_from.setdefault(rel_type, {})
+        backward = edges_to.setdefault(rel_type, {})
+        for vector in vectors:
+            forward.setdefault(vector["from"], []).append(vector)
+            backward.setdefault(vector["to"], []).append(vector)
+    # Keep every adjacency list weight-sorted so callers can take the strongest edges first
+    for adjacency in list(edges_from.values()) + list(edges_to.values()):
+        for vectors in adjacency.values():
+            vectors.sort(key=lambda v: v.get("weight") or 0, reverse=True)
+
+    seed_terms = {}
+    for node_type in SEED_NODE_TYPES:
+        for node in cvot.get("nodes", {}).get(node_type, []):
+            seed_terms[node["id"]] = set(tokenize(node["description"]))
+    doc_freq = {}
+    for terms in seed_terms.values():
+        for term in terms:
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    return {
+        "nodes_by_id": nodes_by_id,
+        "edges_from": edges_from,
+        "edges_to": edges_to,
+        "seed_terms": seed_terms,
+        "seed_doc_freq": doc_freq,
+        "full_context": json.dumps(cvot, indent=2),
+        "search": build_search_index(cvot, edges_from),
+        "best_path_score": _best_path_scores(nodes_by_id, edges_from),
+        "path_cache": {},
+    }
+
+def build_search_index(cvot, edges_from):
+    """Builds a BM25 inverted index over every node's description, aliases and source title."""
+    postings, doc_lengths, node_types = {}, {}, {}
+    for node_type, nodes in cvot.get("nodes", {}).items():
+        for node in nodes:
+            term_weights = {}
+            for field, field_weight in SEARCH_FIELD_WEIGHTS.items():
+                value = node.get(field) or ""
+                for term in tokenize(" ".join(value) if isinstance(value, list) else value):
+                    term_weights[term] = term_weights.get(term, 0.0) + field_weight
+            for term, tf in term_weights.items():
+                postings.setdefault(term, []).append((node["id"], tf))
+            doc_lengths[node["id"]] = sum(term_weights.values())
+            node_types[node["id"]] = node_type
+
+    # Nodes that drive strong outgoing edges (likely causes, well-supported solutions) rank higher
+    out_weight = {}
+    for adjacency in edges_from.values():
+        for from_id, vectors in adjacency.items():
+            out_weight[from_id] = out_weight.get(from_id, 0.0) + sum(v.get("weight") or 0 for v in vectors)
+    max_out = max(out_weight.values(), default=0.0) or 1.0
+
+    doc_count = len(doc_lengths) or 1
+    return {
+        "postings": postings,
+        "idf": {term: math.log(1 + (doc_count - len(p) + 0.5) / (len(p) + 0.5)) for term, p in postings.items()},
+        "doc_lengths": doc_lengths,
+        "avg_doc_length": (sum(doc_lengths.values()) / doc_count) or 1.0,
+        "node_types": node_types,
+        "edge_boost": {node_id: 1 + SEARCH_EDGE_BOOST * weight / max_out for node_id, weight in out_weight.items()},
+    }
+
+def _edge_score(edge):
+    return PATH_WEIGHT_SHARE * (edge.get("weight") or 0) + (1 - PATH_WEIGHT_SHARE) * (edge.get("confidence") or 0)
+
+def _best_path_scores(nodes_by_id, edges_from):
+    """
+    Precomputes, for every node, the best achievable score of a path from it down to a solution.
+    Walking the layers backwards makes this one pass over the edges; best-first search uses it as
+    an exact upper bound, so it only expands paths that can still make the top k.
+    """
+    best = {node_id: 1.0 for node_id, node in nodes_by_id.items() if node.get("type") == "solutions"}
+    for rel_type in reversed(PATH_LAYERS):
+        for from_id, vectors in edges_from.get(rel_type, {}).items():
+            scores = [_edge_score(v) * best[v["to"]] for v in vectors if v["to"] in best]
+            if scores:
+                best[from_id] = max(best.get(from_id, 0.0), max(scores))
+    return best
+
+# --- Diagnosis Lookups ---
+
+def _related_node(index, edge, node_id):
+    """Copies a node and annotates it with the weight and confidence of the edge that reached it."""
+    node = index["nodes_by_id"].get(node_id)
+    if not node: return None
+    return {**node, "weight": edge.get("weight"), "confidence": edge.get("confidence")}
+
+def diagnose_error(index, error_id):
+    """
+    Returns the error node with its weight-sorted causes and deduplicated solutions, or None.
+    Every step is a dictionary lookup, so cost depends only on the size of the answer.
+    """
+    error_node = index["nodes_by_id"].get(error_id)
+    if not error_node or error_node.get("type") != "error_conditions": return None
+
+    causes = []
+    for edge in index["edges_from"]["error_to_cause"].get(error_id, []):
+        cause = _related_node(index, edge, edge["to"])
+        if cause: causes.append(cause)
+
+    # Keep the highest weight when several causes point at the same solution
+    solutions = {}
+    for cause in causes:
+        for edge in index["edges_from"]["cause_to_solution"].get(cause["id"], []):
+            solution = _related_node(index, edge, edge["to"])
+            if not solution: continue
+            current = solutions.get(solution["id"])
+            if current is None or (current["weight"] or 0) < (solution["weight"] or 0):
+                solutions[solution["id"]] = solution
+
+    indicators = [node for node in (_related_node(index, edge, edge["from"])
+                                    for edge in index["edges_to"]["indicator_to_error"].get(error_id, [])) if node]
+    return {
+        "error": error_node,
+        "indicators": indicators,
+        "causes": causes,
+        "solutions": sorted(solutions.values(), key=lambda n: n["weight"] or 0, reverse=True),
+    }
+
+# --- Multi-Hop Diagnosis Paths ---
+
+def _layers_from(node_type):
+    """Returns the relationship layers still to traverse from a node of the given type."""
+    start = {"status_indicators": 0, "error_conditions": 1, "root_causes": 2}.get(node_type)
+    return PATH_LAYERS[start:] if start is not None else []
+
+def _search_paths(index, start_id, k):
+    """Heap-based best-first search for the k highest-scoring paths from start_id to a solution."""
+    start_node = index["nodes_by_id"][start_id]
+    layers = _layers_from(start_node["type"])
+    best = index["best_path_score"]
+    if not layers or start_id not in best: return []
+
+    counter = 0  # Tie-breaker so the heap never compares paths
+    heap = [(-best[start_id], counter, 1.0, [start_id], [])]
+    paths = []
+    while heap and len(paths) < k:
+        _, _, score, node_ids, edges = heapq.heappop(heap)
+        depth = len(edges)
+        if depth == len(layers):
+            paths.append((score, node_ids, edges))
+            continue
+        for edge in index["edges_from"][layers[depth]].get(node_ids[-1], []):
+            if edge["to"] not in best: continue  # Dead end: no solution reachable
+            next_score = score * _edge_score(edge)
+            counter += 1
+            heapq.heappush(heap, (-next_score * best[edge["to"]], counter, next_score, node_ids + [edge["to"]], edges + [edge]))
+    return paths
+
+def find_diagnosis_paths(index, start, k=5):
+    """
+    Returns the k best indicator -> error -> cause -> solution paths starting at `start`, which may be
+    a node id or free text such as "XRSn bit in RESC register". Results are cached per start node.
+    """
+    start_id = start if start in index["nodes_by_id"] else None
+    if start_id is None:
+        for node_types in (["status_indicators"], ["error_conditions"], ["root_causes"]):
+            matches = search_nodes(index, start, 1, node_types)
+            if matches:
+                start_id = matches[0]["id"]
+                break
+    if start_id is None: return None
+
+    cached = index["path_cache"].get(start_id)
+    if cached is None or (len(cached) < k and len(cached) == PATH_CACHE_DEPTH):
+        cached = _search_paths(index, start_id, max(k, PATH_CACHE_DEPTH))
+        index["path_cache"][start_id] = cached
+
+    nodes = index["nodes_by_id"]
+    return {
+        "start": nodes[start_id],
+        "paths": [{
+            "score": round(score, 4),
+            "nodes": [nodes[node_id] for node_id in node_ids],
+            "edges": [{"from": e["from"], "to": e["to"], "weight": e.get("weight"), "confidence": e.get("confidence")} for e in edges],
+        } for score, node_ids, edges in cached[:k]],
+    }
+
+# --- Full-Text Search ---
+
+def highlight(text, query_terms):
+    """HTML-escapes text and wraps the words that matched the query in <mark> tags."""
+    parts, last = [], 0
+    for match in TERM_PATTERN.finditer(text):
+        if query_terms & set(tokenize(match.group(0))):
+            parts.append(html.escape(text[last:match.start()]))
+            parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+            last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+def search_nodes(index, query, k=10, node_types=None):
+    """Returns the top-k nodes for a query, ranked by BM25 times an outgoing edge-weight boost."""
+    search = index["search"]
+    query_terms = set(tokenize(query))
+    scores = {}
+    for term in query_terms:
+        idf = search["idf"].get(term)
+        if idf is None: continue
+        for node_id, tf in search["postings"][term]:
+            if node_types and search["node_types"][node_id] not in node_types: continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * search["doc_lengths"][node_id] / search["avg_doc_length"])
+            scores[node_id] = scores.get(node_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    top = heapq.nlargest(k, ((score * search["edge_boost"].get(node_id, 1.0), node_id) for node_id, score in scores.items()))
+    results = []
+    for score, node_id in top:
+        node = index["nodes_by_id"][node_id]
+        results.append({
+            "id": node_id, "type": node["type"], "description": node["description"],
+            "source_title": node.get("source_title"), "score": round(score, 4),
+            "highlight": highlight(node["description"], query_terms),
+        })
+    return results
+
+# --- Relevance-Scoped Retrieval ---
+
+def find_seed_nodes(index, message, limit=MAX_SEED_NODES):
+    """Ranks error conditions and status indicators by term overlap with the message."""
+    query_terms = set(tokenize(message))
+    if not query_terms: return []
+
+    total = len(index["seed_terms"]) or 1
+    scored = []
+    for node_id, terms in index["seed_terms"].items():
+        shared = query_terms & terms
+        if not shared: continue
+        score = sum(math.log(1 + total / index["seed_doc_freq"][term]) for term in shared)
+        score *= len(shared) / len(terms)  # Prefer nodes that are mostly covered by the question
+        scored.append((score, node_id))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [node_id for _, node_id in scored[:limit]]
+
+def _neighbourhood(index, seed_id):
+    """Collects the seed plus its downstream error -> cause -> solution edges."""
+    node = index["nodes_by_id"][seed_id]
+    edges = []
+    if node["type"] == "status_indicators":
+        indicator_edges = index["edges_from"]["indicator_to_error"].get(seed_id, [])
+        edges.extend(("indicator_to_error", e) for e in indicator_edges)
+        error_ids = [e["to"] for e in indicator_edges]
+    else:
+        error_ids = [seed_id]
+
+    for error_id in error_ids:
+        cause_edges = index["edges_from"]["error_to_cause"].get(error_id, [])
+        edges.extend(("error_to_cause", e) for e in cause_edges)
+        for cause_edge in cause_edges:
+            edges.extend(("cause_to_solution", e) for e in index["edges_from"]["cause_to_solution"].get(cause_edge["to"], []))
+    return edges
+
+def select_relevant_context(index, message, token_budget):
+    """
+    Returns (context_json, stats) holding only the CVOT neighbourhood relevant to the message.
+    Falls back to the full knowledge base when nothing in the graph matches the question.
+    """
+    full_context = index["full_context"]
+    full_tokens = estimate_tokens(full_context)
+    seed_ids = find_seed_nodes(index, message)
+    if not seed_ids:
+        return full_context, {"mode": "full", "reason": "no matching nodes", "context_tokens": full_tokens,
+                              "full_tokens": full_tokens, "trimmed_tokens": 0, "trimmed_pct": 0.0}
+
+    subgraph = {"nodes": {}, "causal_vectors": {rel_type: [] for rel_type in REL_MAP}}
+    seen_nodes, seen_edges = set(), set()
+    used_tokens = estimate_tokens(json.dumps(subgraph))
+
+    def add_node(node_id):
+        nonlocal used_tokens
+        if node_id in seen_nodes: return
+        node = index["nodes_by_id"].get(node_id)
+        if not node: return
+        seen_nodes.add(node_id)
+        subgraph["nodes"].setdefault(node["type"], []).append(
+            {"id": node["id"], "description": node["description"], "source_title": node.get("source_title")})
+        used_tokens += estimate_tokens(json.dumps(node))
+
+    seeds_used = 0
+    for seed_id in seed_ids:
+        if used_tokens >= token_budget: break
+        seeds_used += 1
+        add_node(seed_id)
+        for rel_type, edge in _neighbourhood(index, seed_id):
+            if used_tokens >= token_budget: break
+            key = (rel_type, edge["from"], edge["to"])
+            if key in seen_edges: continue
+            seen_edges.add(key)
+            add_node(edge["from"])
+            add_node(edge["to"])
+            subgraph["causal_vectors"][rel_type].append(
+                {"from": edge["from"], "to": edge["to"], "weight": edge.get("weight"), "confidence": edge.get("confidence")})
+            used_tokens += estimate_tokens(json.dumps(edge))
+
+    context = json.dumps(subgraph, separators=(",", ":"))
+    context_tokens = estimate_tokens(context)
+    trimmed = max(full_tokens - context_tokens, 0)
+    return context, {
+        "mode": "scoped", "seed_nodes": seed_ids[:seeds_used], "nodes": len(seen_nodes), "vectors": len(seen_edges),
+        "context_tokens": context_tokens, "full_tokens": full_tokens, "trimmed_tokens": trimmed,
+        "trimmed_pct": round(100.0 * trimmed / full_tokens, 1),
+    }
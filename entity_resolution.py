@@ -0,0 +1,187 @@
+import random
+import re
+import zlib
+from collections import defaultdict
+
+# --- Configuration ---
+NGRAM_SIZE = 3  # Character n-grams compared between descriptions
+MINHASH_BANDS = 20  # LSH bands x rows = MinHash signature length; pairs sharing any band become candidates
+MINHASH_ROWS = 3
+SAME_WORDS_THRESHOLD = 0.6  # n-gram Jaccard at which descriptions using exactly the same words (reordered, plural) match
+MIN_TYPO_WORD_LENGTH = 5  # Shorter words must match exactly; "Regster" / "Register" is a typo, "read" / "bead" is not
+# Register/bit names shorter than this must match exactly ("XRSn" / "WDRSn"), and longer ones may only differ by one
+# dropped or added letter ("INDDETCT"), since one replaced letter usually names a different bit ("UNC_ERR_L" / "UNC_ERR_H")
+MIN_TYPO_KEY_LENGTH = 6
+MAX_BUCKET_SIZE = 200  # Oversized LSH buckets (very generic descriptions) are skipped rather than compared pairwise
+# The only words one description may add to another and still name the same entity ("Watchdog timer reset")
+FILLER_WORDS = {"timer", "module", "logic", "circuit", "circuitry", "mechanism", "unit", "block", "function", "feature"}
+
+# Two descriptions only merge when their polarity words agree and their key tokens agree up to one typo, so
+# "NMI watchdog reset" never absorbs "Watchdog reset" and "Interrupt not cleared" never absorbs "Interrupt cleared"
+NEGATION_PREFIXES = ("un", "non", "in", "im", "dis", "mis")  # "Uncorrectable error" vs "Correctable error"
+POLARITY_WORDS = {"no", "not", "non", "never", "without", "cannot", "invalid", "incorrect", "disable", "disabled", "unable"}
+WORD_PATTERN = re.compile(r"[a-z0-9_]+(?:\.[a-z0-9_]+)*")
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+(?:\.[A-Za-z0-9_]+)*")
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # Fixed seed so resolution is reproducible across runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(MINHASH_BANDS * MINHASH_ROWS)]
+
+def is_key_token(token):
+    """Acronyms, register/bit names and anything with a digit (NMI, XRSn, SYSCTL.RSTCAUSE, NMI_FLG, 00b)."""
+    return sum(c.isupper() for c in token) >= 2 or any(c.isdigit() for c in token) or "_" in token or "." in token
+
+def describe(description):
+    """Precomputes the normalized word set, n-gram shingles and guard tokens for one description."""
+    words = WORD_PATTERN.findall(description.lower())
+    # Plural "s" is dropped so "ECC errors" and "ECC error" compare as the same words
+    words = [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word for word in words]
+    return {
+        "sequence": tuple(words),
+        "words": frozenset(words),
+        "shingles": shingles(" ".join(words)),
+        "key_tokens": frozenset(token.lower() for token in TOKEN_PATTERN.findall(description) if is_key_token(token)),
+        "polarity": frozenset(words) & POLARITY_WORDS,
+    }
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def shingles(text):
+    text = f" {text} "
+    return frozenset(text[i:i + NGRAM_SIZE] for i in range(max(len(text) - NGRAM_SIZE + 1, 1)))
+
+def negates(words, other_words):
+    return any(f"{prefix}{word}" in other_words for word in words for prefix in NEGATION_PREFIXES)
+
+def one_edit_apart(a, b, min_length, substitution=True):
+    """True if a and b differ by one inserted, deleted or (optionally) replaced character that is not a digit."""
+    if min(len(a), len(b)) < min_length or abs(len(a) - len(b)) > 1 or a == b: return False
+    if len(a) == len(b) and not substitution: return False
+    if [c for c in a if c.isdigit()] != [c for c in b if c.isdigit()]: return False
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    if len(a) == len(b): return a[prefix + 1:] == b[prefix + 1:]
+    longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+    return longer[prefix + 1:] == shorter[prefix:]
+
+def typo_pairs(only_a, only_b, min_length, substitution=True):
+    """True if the words only one side has pair up one-to-one as single-character typos of each other."""
+    if len(only_a) != len(only_b): return False
+    remaining = set(only_b)
+    for word in sorted(only_a):
+        match = next((other for other in sorted(remaining) if one_edit_apart(word, other, min_length, substitution)), None)
+        if match is None: return False
+        remaining.discard(match)
+    return True
+
+def hyphenated(a, b, only_a, only_b):
+    """True if the words only one side has are the other's words written together ("Brown-out" / "Brownout")."""
+    return "".join(w for w in a["sequence"] if w in only_a) == "".join(w for w in b["sequence"] if w in only_b)
+
+def is_variant(a, b):
+    """
+    True if two described entities of the same type are the same entity spelled differently: the same
+    words reordered or pluralized, a single-character typo in a word or register name ("Regster flag
+    ERRSTS", "DCDCSTS.INDDETCT"), a hyphenated compound ("Brown-out reset"), or an added filler word
+    ("Watchdog timer reset"). Any other added word ("double error" / "Double-bit data error") makes a
+    more specific entity, never a variant.
+    """
+    if a["polarity"] != b["polarity"]: return False
+    if not typo_pairs(a["key_tokens"] - b["key_tokens"], b["key_tokens"] - a["key_tokens"], MIN_TYPO_KEY_LENGTH, substitution=False): return False
+    only_a, only_b = a["words"] - b["words"], b["words"] - a["words"]
+    if negates(only_a, only_b) or negates(only_b, only_a): return False
+    if not only_a and not only_b:
+        return jaccard(a["shingles"], b["shingles"]) >= SAME_WORDS_THRESHOLD
+    if not only_a or not only_b:
+        shorter, extra = (a, only_b) if not only_a else (b, only_a)
+        return extra <= FILLER_WORDS and len(shorter["words"]) >= 2
+    return hyphenated(a, b, only_a, only_b) or typo_pairs(only_a, only_b, MIN_TYPO_WORD_LENGTH)
+
+def minhash_signature(shingles, memo):
+    """MinHash over the shingles; per-shingle hash rows are memoized since shingles repeat across nodes."""
+    rows = []
+    for shingle in shingles:
+        row = memo.get(shingle)
+        if row is None:
+            x = zlib.crc32(shingle.encode("utf-8"))
+            row = memo[shingle] = tuple((a * x + b) % _PRIME for a, b in _PERMUTATIONS)
+        rows.append(row)
+    return [min(column) for column in zip(*rows)]
+
+def candidate_pairs(features):
+    """LSH banding: yields index pairs that share at least one band of their MinHash signatures."""
+    memo, buckets = {}, defaultdict(list)
+    for i, feature in enumerate(features):
+        signature = minhash_signature(feature["shingles"], memo)
+        for band in range(MINHASH_BANDS):
+            buckets[(band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))].append(i)
+    seen = set()
+    for members in buckets.values():
+        if len(members) < 2 or len(members) > MAX_BUCKET_SIZE: continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                pair = (members[x], members[y])
+                if pair not in seen:
+                    seen.add(pair)
+                    yield pair
+
+def find_clusters(descriptions):
+    """
+    Groups spelling variants with union-find. Returns a root index for every description.
+    """
+    parent = list(range(len(descriptions)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)  # The earliest node stays canonical
+
+    features = [describe(description) for description in descriptions]
+    for i, j in candidate_pairs(features):
+        if is_variant(features[i], features[j]):
+            union(i, j)
+    return [find(i) for i in range(len(descriptions))]
+
+def resolve_entities(cvot):
+    """
+    Merges near-duplicate nodes of each type into canonical nodes (the earliest of each cluster,
+    listing the others' descriptions as aliases) and remaps the causal vectors onto them.
+    Vectors that collapse onto the same pair keep the highest-confidence one.
+    """
+    id_map, nodes_before, nodes_after = {}, 0, 0
+    for node_type, nodes in cvot["nodes"].items():
+        roots = find_clusters([node["description"] for node in nodes])
+        kept = []
+        for node, root in zip(nodes, roots):
+            canonical = nodes[root]
+            id_map[node["id"]] = canonical["id"]
+            if node is canonical:
+                kept.append(node)
+            elif node["description"] not in canonical.setdefault("aliases", []):
+                canonical["aliases"].append(node["description"])
+        nodes_before += len(nodes)
+        nodes_after += len(kept)
+        cvot["nodes"][node_type] = kept
+
+    vectors_before, vectors_after = 0, 0
+    for rel_type, vectors in cvot["causal_vectors"].items():
+        best = {}
+        for vector in vectors:
+            vector = {**vector, "from": id_map.get(vector["from"], vector["from"]), "to": id_map.get(vector["to"], vector["to"])}
+            key = (vector["from"], vector["to"])
+            if key not in best or vector.get("confidence", 0) > best[key].get("confidence", 0):
+                best[key] = vector
+        vectors_before += len(vectors)
+        vectors_after += len(best)
+        cvot["causal_vectors"][rel_type] = list(best.values())
+
+    print(f"  - Entity resolution: {nodes_before} -> {nodes_after} nodes, {vectors_before} -> {vectors_after} causal vectors.")
+    return cvot
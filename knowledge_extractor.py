@@ -1,19 +1,43 @@
 import os
 import json
-import anthropic
 from dotenv import load_dotenv
 import re
+import threading
 import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+import argparse
+import glob
+from cvot_index import CHARS_PER_TOKEN, REL_MAP, estimate_tokens
+from entity_resolution import resolve_entities
+from checkpoint import (append_record, assign_legacy_records, index_records, iter_latest_records, load_manifest,
+                        make_record, migrate_legacy_checkpoint, repair_checkpoint, save_manifest)
+from llm_batch import batch_request, run_batch
+from llm_cache import cached_create, response_cache
+from page_index import find_relevant_pages, group_pages_into_sections, load_page_index
+from section_planner import plan_sections
+from llm_client import create_client
+from pdf_pages import get_section_text, load_page_texts, page_hashes, section_hash
 
 load_dotenv()
 
 # --- Configuration ---
-PDF_PATH = "mspm0c1104.pdf"
-INTERMEDIATE_FILE = "intermediate_data.json"
+PDF_PATH = "mspm0c1104.pdf"  # Default document when neither --pdf nor --pdf-dir is given
+PDF_DIR = os.getenv("EXTRACTOR_PDF_DIR")  # Ingest every *.pdf in this directory instead
+MANIFEST_FILE = "extraction_manifest.json"  # Page and section content hashes per document from the last run
+DOC_WORKERS = int(os.getenv("EXTRACTOR_DOC_WORKERS", "4"))  # Documents indexed and hashed concurrently, one process each
+SECTION_DISCOVERY = os.getenv("EXTRACTOR_SECTION_DISCOVERY", "toc")  # toc (full-text fallback) | fulltext
+INTERMEDIATE_FILE = "intermediate_data.jsonl"  # Append-only checkpoint, one record per section
+LEGACY_INTERMEDIATE_FILE = "intermediate_data.json"  # Migrated into INTERMEDIATE_FILE on first resume
 OUTPUT_FILE = "ti_mcu_cvot.json"
 ANTHROPIC_MODEL = "claude-sonnet-4-20250514" 
 RESUME_PROCESSING = True
+RESOLVE_ENTITIES = True  # Merge near-duplicate node descriptions into canonical nodes before writing the CVOT
+MAX_WORKERS = int(os.getenv("EXTRACTOR_MAX_WORKERS", "4"))  # Sections processed concurrently
+# Sections larger than the budget are split into overlapping sub-chunks, each extracted on its own
+SUB_CHUNK_TOKEN_BUDGET = int(os.getenv("EXTRACTOR_SUB_CHUNK_TOKENS", "6000"))
+SUB_CHUNK_OVERLAP_TOKENS = 300  # Repeated at the start of the next sub-chunk so entities spanning a cut aren't lost
+SUB_CHUNK_WORKERS = int(os.getenv("EXTRACTOR_SUB_CHUNK_WORKERS", "4"))  # Per section; llm_client still caps total in-flight requests
 
 # --- Texas Instruments Microcontroller (MCU) Specific Configuration ---
 TI_MCU_CONFIG = {
@@ -29,13 +53,24 @@ TI_MCU_CONFIG = {
     "safety_level": "N/A (General Purpose MCU)"
 }
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+client = create_client()
 
 # --- PDF Processing and Text Extraction (Optimized) ---
 
+def find_sections_by_full_text(pdf_path, keywords, toc=()):
+    """Finds relevant page ranges through the full-text page index, for keywords the TOC doesn't name."""
+    page_index = load_page_index(pdf_path)
+    pages = find_relevant_pages(page_index, keywords)
+    sections = group_pages_into_sections(pages, toc)
+    print(f"  - Full-text index: {len(pages)} of {page_index['page_count']} pages match, grouped into {len(sections)} sections.")
+    for title, pages in sections.items():
+        print(f"  - Found relevant pages via full-text index: '{title}'")
+    return sections
+
 def create_document_index(pdf_path, keywords):
     """
-    Pass 1: Scans the PDF's table of contents to build an index of relevant sections.
+    Pass 1: Scans the PDF's table of contents to plan non-overlapping relevant sections, falling
+    back to the full-text page index when the TOC names none of the keywords.
     """
     index = {}
     print(f"--- Pass 1: Indexing {os.path.basename(pdf_path)} ---")
@@ -43,21 +78,23 @@ def create_document_index(pdf_path, keywords):
         doc = fitz.open(pdf_path)
         toc = doc.get_toc()
         potential_sections = []
-        for level, title, page_num in toc:
+        for level, title, page_num in toc if SECTION_DISCOVERY != "fulltext" else []:
             if any(keyword in title.lower() for keyword in keywords):
                 print(f"  - Found relevant section in TOC: '{title}' on page {page_num}")
                 potential_sections.append({"title": title, "start_page": page_num})
         
         if not potential_sections:
-            print("  - No keywords found in TOC. Consider manual indexing or full-text search.")
-            return {}
-
-        potential_sections.sort(key=lambda x: x['start_page'])
-        for i, section in enumerate(potential_sections):
-            end_page = doc.page_count
-            if i + 1 < len(potential_sections):
-                end_page = potential_sections[i+1]['start_page'] - 1
-            index[section['title']] = {"start_page": section['start_page'], "end_page": end_page}
+            if SECTION_DISCOVERY != "fulltext":
+                print("  - No keywords found in TOC. Falling back to the full-text page index.")
+            index = find_sections_by_full_text(pdf_path, keywords, toc)
+        else:
+            # TOC levels give each entry its real extent, so parents and children never send the same pages twice
+            index, report = plan_sections(toc, load_page_texts(pdf_path), keywords)
+            print(f"  - Planned {report['planned_sections']} non-overlapping sections ({report['planned_pages']} pages, "
+                  f"~{report['planned_tokens']} tokens) from {len(potential_sections)} matching TOC entries.")
+            print(f"  - Naive index: {report['naive_sections']} sections ({report['naive_empty_sections']} empty), "
+                  f"~{report['naive_tokens']} tokens. Saves ~{report['tokens_saved']} input tokens per extraction stage: "
+                  f"~{report['overlap_tokens']} of overlap, ~{report['dropped_tokens']} from {report['dropped_pages']} pages outside any matching heading.")
 
     except Exception as e:
         print(f"  - ERROR creating index for {os.path.basename(pdf_path)}: {e}")
@@ -66,31 +103,24 @@ def create_document_index(pdf_path, keywords):
     return index
 
 def extract_text_from_chunk(pdf_path, start_page, end_page):
-    """Extracts coherent text from a specified range of pages using PyMuPDF."""
-    text = ""
+    """Extracts coherent text from a specified range of pages via the shared page-text store."""
     print(f"    - Extracting text from pages {start_page} to {end_page}...")
     try:
-        with fitz.open(pdf_path) as doc:
-            for page_num in range(start_page - 1, end_page):
-                if page_num < doc.page_count:
-                    text += doc[page_num].get_text("text") + "\n\n"
+        return get_section_text(pdf_path, start_page, end_page)
     except Exception as e:
         print(f"    - ERROR reading PDF chunk: {e}")
-    return text
+        return ""
 
 # --- LLM Interaction (Generalized) ---
 
 def call_llm(system_prompt, user_prompt, max_tokens=4000):
-    """Generic LLM call function."""
+    """Generic LLM call function, with rate-limit-aware retries and the shared on-disk response cache."""
+    params = {
+        "model": ANTHROPIC_MODEL, "max_tokens": max_tokens, "temperature": 0.1,
+        "system": system_prompt, "messages": [{"role": "user", "content": user_prompt}],
+    }
     try:
-        response = client.messages.create(
-            model=ANTHROPIC_MODEL,
-            max_tokens=max_tokens,
-            temperature=0.1,
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_prompt}]
-        )
-        return response.content[0].text
+        return cached_create(client, params)
     except Exception as e:
         print(f"    - ERROR calling LLM: {e}")
         return None
@@ -105,15 +135,18 @@ def extract_json_from_response(response_text):
     print("    - WARNING: No JSON object found in response.")
     return None
 
-def stage_1_extract_entities(text_chunk, config):
-    """Stage 1: Extracts structured entities based on the provided configuration."""
+def build_stage_1_prompts(text_chunk, config):
+    """Builds the (system, user) prompts for stage 1 entity extraction."""
     entity_definitions = "\n".join([f"- {name}: {desc}" for name, desc in config["entity_types"].items()])
     entity_keys = list(config["entity_types"].keys())
 
     system_prompt = f"You are an expert in embedded systems. Your task is to extract troubleshooting information from technical manuals for the {config['system_name']}. Analyze the text and identify the following entities:\n{entity_definitions}\nRespond with ONLY a single, valid JSON object containing keys for each entity type: {json.dumps(entity_keys)}. Each key must map to an array of concise, descriptive strings."
     user_prompt = f"Extract all relevant entities from this text chunk:\n\n---\n\n{text_chunk}"
+    return system_prompt, user_prompt
 
-    response_text = call_llm(system_prompt, user_prompt)
+def parse_stage_1_response(response_text, config):
+    """Parses a stage 1 response into entity lists, with every entity type present."""
+    entity_keys = list(config["entity_types"].keys())
     json_string = extract_json_from_response(response_text)
     
     if not json_string: return {key: [] for key in entity_keys}
@@ -126,8 +159,14 @@ def stage_1_extract_entities(text_chunk, config):
         print(f"    - [Stage 1] Failed to decode JSON: {e}")
         return {key: [] for key in entity_keys}
 
-def stage_2_build_relationships(text_chunk, entities):
-    """Stage 2: Builds causal relationships between the extracted entities."""
+def stage_1_extract_entities(text_chunk, config):
+    """Stage 1: Extracts structured entities based on the provided configuration. Returns None if the LLM call failed."""
+    response_text = call_llm(*build_stage_1_prompts(text_chunk, config))
+    if response_text is None: return None
+    return parse_stage_1_response(response_text, config)
+
+def build_stage_2_prompts(text_chunk, entities):
+    """Builds the (system, user) prompts for stage 2 relationship mapping."""
     system_prompt = """You are an AI specializing in causal analysis of technical systems. Based on the provided text and a list of entities, map the relationships between them to determine:
 1. Which status indicators correspond to which error conditions.
 2. Which root causes lead to specific error conditions.
@@ -135,8 +174,10 @@ def stage_2_build_relationships(text_chunk, entities):
 
 Respond with ONLY a single, valid JSON object with these keys: `indicator_to_error`, `error_to_cause`, `cause_to_solution`."""
     user_prompt = f"Analyze the following text chunk and entities to build the causal maps.\n\nTEXT CHUNK:\n---\n{text_chunk}\n---\n\nEXTRACTED ENTITIES:\n---\n{json.dumps(entities, indent=2)}\n---\n\nGenerate the JSON object with the relationship maps."
-    
-    response_text = call_llm(system_prompt, user_prompt)
+    return system_prompt, user_prompt
+
+def parse_stage_2_response(response_text):
+    """Parses a stage 2 response into relationship maps."""
     json_string = extract_json_from_response(response_text)
 
     if not json_string: return {}
@@ -146,122 +187,432 @@ Respond with ONLY a single, valid JSON object with these keys: `indicator_to_err
         print(f"    - [Stage 2] Failed to decode JSON: {e}")
         return {}
 
+def stage_2_build_relationships(text_chunk, entities):
+    """Stage 2: Builds causal relationships between the extracted entities. Returns None if the LLM call failed."""
+    response_text = call_llm(*build_stage_2_prompts(text_chunk, entities))
+    if response_text is None: return None
+    return parse_stage_2_response(response_text)
+
 # --- CVOT Assembly ---
 
-def build_final_cvot(all_data, config):
-    """Builds the final CVOT structure from all processed chunks."""
-    cvot = {
-        "cvot_metadata": {
-            "system": config["system_name"], "version": "1.0", "created_date": datetime.now().strftime("%Y-%m-%d"),
-            "description": f"Causal Vector Orchestration Template for {config['system_name']} troubleshooting.",
-            "safety_level": config["safety_level"]
-        },
-        "nodes": {}, "causal_vectors": {}
-    }
-    
-    for entity_type in config["entity_types"]:
-        cvot["nodes"][entity_type] = []
-    
-    REL_MAP = {
-        "indicator_to_error": {"from": "status_indicators", "to": "error_conditions"},
-        "error_to_cause": {"from": "error_conditions", "to": "root_causes"},
-        "cause_to_solution": {"from": "root_causes", "to": "solutions"},
-    }
-    for rel_type in REL_MAP:
-        cvot["causal_vectors"][rel_type] = []
+class CVOTAssembler:
+    """
+    Accumulates nodes and causal vectors into a CVOT, deduplicating both through dict/set lookups
+    so assembly stays linear in the number of entities and edges.
+    """
+
+    def __init__(self, metadata, node_types):
+        self.cvot = {"cvot_metadata": metadata, "nodes": {node_type: [] for node_type in node_types},
+                     "causal_vectors": {rel_type: [] for rel_type in REL_MAP}}
+        self.node_map = {}  # (node_type, normalized description) -> node id
+        self.vector_keys = set()  # (rel_type, from id, to id)
 
-    node_map, node_id_counter = {}, 0
-    def add_node(node_type, description, source_title):
-        nonlocal node_id_counter
+    def add_node(self, node_type, description, source_title, **extra):
         key = (node_type, description.lower().strip())
-        if key in node_map: return node_map[key]
-        
-        node_id_counter += 1
-        node_id = f"N{node_id_counter:04d}"
-        node = {"id": node_id, "type": node_type, "description": description, "source_title": source_title}
-        cvot["nodes"][node_type].append(node)
-        node_map[key] = node_id
+        if key in self.node_map: return self.node_map[key]
+
+        node_id = f"N{len(self.node_map) + 1:04d}"
+        node = {"id": node_id, "type": node_type, "description": description, "source_title": source_title, **extra}
+        self.cvot["nodes"].setdefault(node_type, []).append(node)
+        self.node_map[key] = node_id
         return node_id
 
-    for chunk_data in all_data:
+    def find_node(self, node_type, description):
+        return self.node_map.get((node_type, description.lower().strip()))
+
+    def add_vector(self, rel_type, from_id, to_id, weight=0.5, confidence=0.5, **extra):
+        key = (rel_type, from_id, to_id)
+        if key in self.vector_keys: return False
+        self.vector_keys.add(key)
+        self.cvot["causal_vectors"][rel_type].append({"from": from_id, "to": to_id, "weight": weight, "confidence": confidence, **extra})
+        return True
+
+def build_final_cvot(records, config):
+    """
+    Builds the final CVOT by streaming chunk records once (e.g. straight from the checkpoint).
+    Relationships whose endpoints haven't been seen yet are held back and resolved at the end,
+    so the result matches a two-pass build without keeping every record in memory.
+    """
+    metadata = {
+        "system": config["system_name"], "version": "1.0", "created_date": datetime.now().strftime("%Y-%m-%d"),
+        "description": f"Causal Vector Orchestration Template for {config['system_name']} troubleshooting.",
+        "safety_level": config["safety_level"]
+    }
+    assembler = CVOTAssembler(metadata, config["entity_types"])
+    unresolved = []  # (rel_type, from description, to description)
+
+    def add_relationship(rel_type, from_item, to_item):
+        from_id = assembler.find_node(REL_MAP[rel_type]["from"], from_item)
+        to_id = assembler.find_node(REL_MAP[rel_type]["to"], to_item)
+        if from_id and to_id:
+            assembler.add_vector(rel_type, from_id, to_id)  # Default placeholder weight/confidence
+            return True
+        return False
+
+    for chunk_data in records:
         title = chunk_data.get("title")
-        entities = chunk_data.get("entities", {})
-        for node_type, items in entities.items():
-            if node_type in cvot["nodes"]:
+        # The source document travels with the node so weighting finds the right section text
+        source = {"source_doc": chunk_data["doc"]} if chunk_data.get("doc") else {}
+        for node_type, items in chunk_data.get("entities", {}).items():
+            if node_type in config["entity_types"]:
                 for item in items:
-                    add_node(node_type, item, title)
-
-    for chunk_data in all_data:
-        relationships = chunk_data.get("relationships", {})
-        for rel_type, mappings in relationships.items():
-            if rel_type in REL_MAP:
-                node_types = REL_MAP[rel_type]
-                from_node_type, to_node_type = node_types["from"], node_types["to"]
-                
-                for from_item, to_items in mappings.items():
-                    from_id = node_map.get((from_node_type, from_item.lower().strip()))
-                    if from_id:
-                        for to_item in to_items:
-                            to_id = node_map.get((to_node_type, to_item.lower().strip()))
-                            if to_id:
-                                vector = {"from": from_id, "to": to_id, "weight": 0.5, "confidence": 0.5} # Default placeholder values
-                                if vector not in cvot["causal_vectors"][rel_type]:
-                                    cvot["causal_vectors"][rel_type].append(vector)
-    return cvot
+                    assembler.add_node(node_type, item, title, **source)
 
-# --- Main Execution ---
+        for rel_type, mappings in chunk_data.get("relationships", {}).items():
+            if rel_type not in REL_MAP: continue
+            for from_item, to_items in mappings.items():
+                for to_item in to_items:
+                    if not add_relationship(rel_type, from_item, to_item):
+                        unresolved.append((rel_type, from_item, to_item))
 
-if __name__ == "__main__":
-    print("--- Starting MCU Knowledge Extraction ---")
-    doc_index = create_document_index(PDF_PATH, TI_MCU_CONFIG["index_keywords"])
-    if not doc_index:
-        print("\n--- No relevant sections found. Exiting. ---")
-        exit()
+    for rel_type, from_item, to_item in unresolved:
+        add_relationship(rel_type, from_item, to_item)
+    return assembler.cvot
+
+def merge_cvots(cvots):
+    """
+    Merges several CVOTs (e.g. one per datasheet) into one graph without re-running extraction.
+    Nodes are unified by (type, description) and renumbered; duplicate vectors keep the first
+    occurrence's weight and confidence. Metadata comes from the first CVOT.
+    """
+    metadata = {**cvots[0]["cvot_metadata"], "created_date": datetime.now().strftime("%Y-%m-%d"),
+                "merged_from": [cvot["cvot_metadata"].get("system") for cvot in cvots]}
+    assembler = CVOTAssembler(metadata, [node_type for cvot in cvots for node_type in cvot["nodes"]])
+    for cvot in cvots:
+        id_map = {}
+        for node_type, nodes in cvot["nodes"].items():
+            for node in nodes:
+                extra = {k: v for k, v in node.items() if k not in ("id", "type", "description", "source_title")}
+                id_map[node["id"]] = assembler.add_node(node_type, node["description"], node.get("source_title"), **extra)
+        for rel_type, vectors in cvot["causal_vectors"].items():
+            if rel_type not in REL_MAP: continue
+            for vector in vectors:
+                if vector["from"] in id_map and vector["to"] in id_map:
+                    extra = {k: v for k, v in vector.items() if k not in ("from", "to")}
+                    assembler.add_vector(rel_type, id_map[vector["from"]], id_map[vector["to"]], **extra)
+    return assembler.cvot
+
+# --- Sub-Chunking and Merging ---
+
+def split_into_sub_chunks(text, token_budget=SUB_CHUNK_TOKEN_BUDGET, overlap_tokens=SUB_CHUNK_OVERLAP_TOKENS):
+    """
+    Splits text into line-aligned sub-chunks of at most token_budget tokens, each starting with
+    up to overlap_tokens of the previous sub-chunk's tail. Text within budget is returned whole.
+    """
+    max_chars, overlap_chars = token_budget * CHARS_PER_TOKEN, overlap_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars: return [text]
+
+    # Over-long lines (e.g. flattened register tables) are hard-split so carried overlap + a line always fits
+    piece_chars = max(max_chars - overlap_chars, 1)
+    lines = [line[i:i + piece_chars] for line in text.splitlines(keepends=True) for i in range(0, len(line), piece_chars)]
+
+    sub_chunks, current, size = [], [], 0
+    for line in lines:
+        if current and size + len(line) > max_chars:
+            sub_chunks.append("".join(current))
+            carry, carry_size = [], 0
+            for previous in reversed(current):
+                if carry_size + len(previous) > overlap_chars: break
+                carry.insert(0, previous)
+                carry_size += len(previous)
+            current, size = carry, carry_size
+        current.append(line)
+        size += len(line)
+    sub_chunks.append("".join(current))
+    return sub_chunks
+
+def has_key_entities(entities):
+    return bool(entities.get("error_conditions") or entities.get("root_causes"))
+
+def merge_extractions(parts, config):
+    """
+    Merges per-sub-chunk (entities, relationships) pairs into one section result, deduplicating
+    entities case-insensitively (first spelling wins) and relationship targets per source item.
+    """
+    entities = {key: [] for key in config["entity_types"]}
+    seen_entities = {key: {} for key in config["entity_types"]}
+    relationships, seen_targets = {}, {}
+
+    def canonical(node_type, item):
+        """Maps an item onto the first spelling seen for it, so relationships and nodes stay in step."""
+        return seen_entities.get(node_type, {}).get(item.lower().strip(), item)
+
+    for part_entities, _ in parts:
+        for node_type, items in part_entities.items():
+            if node_type not in entities or not isinstance(items, list): continue
+            for item in items:
+                if not isinstance(item, str) or not item.strip(): continue
+                key = item.lower().strip()
+                if key not in seen_entities[node_type]:
+                    seen_entities[node_type][key] = item
+                    entities[node_type].append(item)
+
+    for _, part_relationships in parts:
+        for rel_type, mappings in part_relationships.items():
+            if rel_type not in REL_MAP or not isinstance(mappings, dict): continue
+            from_type, to_type = REL_MAP[rel_type]["from"], REL_MAP[rel_type]["to"]
+            merged = relationships.setdefault(rel_type, {})
+            for from_item, to_items in mappings.items():
+                if isinstance(to_items, str): to_items = [to_items]
+                from_item = canonical(from_type, from_item)
+                targets = merged.setdefault(from_item, [])
+                seen = seen_targets.setdefault((rel_type, from_item.lower().strip()), set())
+                for to_item in to_items:
+                    if not isinstance(to_item, str): continue
+                    to_item = canonical(to_type, to_item)
+                    if to_item.lower().strip() in seen: continue
+                    seen.add(to_item.lower().strip())
+                    targets.append(to_item)
+    return entities, relationships
+
+# --- Section Processing ---
+
+def process_sub_chunk(section_title, label, text_chunk):
+    """Runs stage 1 and stage 2 on one sub-chunk. Returns (entities, relationships), or None if an LLM call failed."""
+    print(f"    - [{section_title}{label}] [Stage 1] Extracting entities...")
+    entities = stage_1_extract_entities(text_chunk, TI_MCU_CONFIG)
+    if entities is None: return None
+    if not has_key_entities(entities):
+        return entities, {}
+    print(f"    - [{section_title}{label}] [Stage 2] Building relationships...")
+    relationships = stage_2_build_relationships(text_chunk, entities)
+    if relationships is None: return None
+    return entities, relationships
+
+def process_section(section):
+    """
+    Runs stage 1 and stage 2 for one planned section, splitting oversized sections into sub-chunks
+    that are extracted concurrently and merged. Returns the chunk record, or None if it was skipped.
+    Raises if any sub-chunk's LLM call failed, so the section stays unrecorded and is retried next run.
+    """
+    section_title = section["title"]
+    print(f"\n>>> Processing Section: '{section_title}' ({section['doc']}, Pages {section['start_page']}-{section['end_page']})")
+    text_chunk = extract_text_from_chunk(section["pdf_path"], section['start_page'], section['end_page'])
+    if not text_chunk or len(text_chunk) < 100:
+        print(f"    - [{section_title}] Section text is too short or empty. Skipping.")
+        return None
 
-    all_chunk_data = []
-    if RESUME_PROCESSING and os.path.exists(INTERMEDIATE_FILE):
-        print("\n--- Found existing processed data. Loading... ---")
-        with open(INTERMEDIATE_FILE, 'r') as f: all_chunk_data = json.load(f)
+    sub_chunks = split_into_sub_chunks(text_chunk)
+    if len(sub_chunks) == 1:
+        parts = [process_sub_chunk(section_title, "", text_chunk)]
+    else:
+        print(f"    - [{section_title}] ~{estimate_tokens(text_chunk)} tokens; split into {len(sub_chunks)} sub-chunks.")
+        with ThreadPoolExecutor(max_workers=SUB_CHUNK_WORKERS) as executor:
+            parts = list(executor.map(process_sub_chunk, [section_title] * len(sub_chunks),
+                                      [f" {i + 1}/{len(sub_chunks)}" for i in range(len(sub_chunks))], sub_chunks))
+    failed = sum(1 for part in parts if part is None)
+    if failed:
+        raise RuntimeError(f"LLM call failed for {failed} of {len(parts)} sub-chunks; the section is left for the next run")
+    entities, relationships = merge_extractions(parts, TI_MCU_CONFIG)
+
+    if not has_key_entities(entities):
+        print(f"    - [{section_title}] No key error conditions or causes found. Skipping relationship mapping.")
+        return None
+    print(f"      - [{section_title}] Found {len(entities.get('error_conditions', []))} error conditions and {len(entities.get('root_causes', []))} causes.")
+    print(f"      - [{section_title}] Built {len(relationships.get('error_to_cause', {}))} cause relationships.")
 
-    processed_titles = {chunk['title'] for chunk in all_chunk_data}
+    # The raw text is kept (in the blob store) for contextual weight analysis
+    return make_section_record(section, text_chunk, entities, relationships)
 
-    for section_title, pages in doc_index.items():
-        if section_title in processed_titles:
-            print(f"\n>>> Skipping already processed section: '{section_title}'")
-            continue
+def make_section_record(section, text_chunk, entities, relationships):
+    return make_record(section["title"], text_chunk, entities, relationships, doc=section["doc"], section_hash=section["section_hash"])
 
-        print(f"\n>>> Processing Section: '{section_title}' (Pages {pages['start_page']}-{pages['end_page']})")
-        text_chunk = extract_text_from_chunk(PDF_PATH, pages['start_page'], pages['end_page'])
+def process_sections_in_batches(pending):
+    """
+    Offline bulk mode: submits every stage 1 prompt (one per sub-chunk) as one Message Batches job,
+    then every stage 2 prompt as another. Returns (chunk records for sections that produced entities,
+    (doc, title) keys of sections whose requests failed and must not be checkpointed).
+    """
+    sections, texts, sub_chunks = {}, {}, {}
+    for section in pending:
+        text_chunk = extract_text_from_chunk(section["pdf_path"], section['start_page'], section['end_page'])
         if not text_chunk or len(text_chunk) < 100:
-            print("    - Section text is too short or empty. Skipping.")
+            print(f"    - [{section['title']}] Section text is too short or empty. Skipping.")
             continue
-
-        print("    - [Stage 1] Extracting entities...")
-        entities = stage_1_extract_entities(text_chunk, TI_MCU_CONFIG)
-        if not entities.get("error_conditions") and not entities.get("root_causes"):
-            print("    - No key error conditions or causes found. Skipping relationship mapping.")
+        sections[len(sections)] = section
+        texts[len(texts)] = text_chunk
+    # Batch custom_ids only allow [a-zA-Z0-9_-], so sections and sub-chunks are referenced by position
+    ids = {}
+    for i in sections:
+        for j, sub_chunk in enumerate(split_into_sub_chunks(texts[i])):
+            ids[f"section-{i:05d}-{j:03d}"] = i
+            sub_chunks[f"section-{i:05d}-{j:03d}"] = sub_chunk
+
+    print(f"\n--- [Stage 1] Submitting {len(ids)} sub-chunks from {len(sections)} sections as a batch ---")
+    stage_1_requests = [batch_request(custom_id, ANTHROPIC_MODEL, *build_stage_1_prompts(sub_chunks[custom_id], TI_MCU_CONFIG))
+                        for custom_id in ids]
+    stage_1_results = run_batch(client, stage_1_requests, label="stage 1")
+    # A request that errored or expired maps to None; its section must not be recorded as complete
+    failed_sections = {i for custom_id, i in ids.items() if stage_1_results.get(custom_id) is None}
+    entities_by_id = {custom_id: parse_stage_1_response(stage_1_results.get(custom_id), TI_MCU_CONFIG) for custom_id in ids}
+
+    stage_2_ids = [custom_id for custom_id, entities in entities_by_id.items() if has_key_entities(entities)]
+    print(f"\n--- [Stage 2] Submitting {len(stage_2_ids)} sub-chunks as a batch ---")
+    stage_2_requests = [batch_request(custom_id, ANTHROPIC_MODEL, *build_stage_2_prompts(sub_chunks[custom_id], entities_by_id[custom_id]))
+                        for custom_id in stage_2_ids]
+    stage_2_results = run_batch(client, stage_2_requests, label="stage 2")
+    failed_sections.update(ids[custom_id] for custom_id in stage_2_ids if stage_2_results.get(custom_id) is None)
+
+    parts_by_section = {}
+    for custom_id, i in ids.items():
+        relationships = parse_stage_2_response(stage_2_results.get(custom_id)) if custom_id in stage_2_results else {}
+        parts_by_section.setdefault(i, []).append((entities_by_id[custom_id], relationships))
+
+    chunks = []
+    for i, parts in parts_by_section.items():
+        if i in failed_sections:
+            print(f"    - [{sections[i]['title']}] An LLM request failed; the section is left for the next run.")
             continue
-        print(f"      - Found {len(entities.get('error_conditions', []))} error conditions and {len(entities.get('root_causes', []))} causes.")
-        
-        print("    - [Stage 2] Building relationships...")
-        relationships = stage_2_build_relationships(text_chunk, entities)
-        print(f"      - Built {len(relationships.get('error_to_cause', {}))} cause relationships.")
+        entities, relationships = merge_extractions(parts, TI_MCU_CONFIG)
+        if not has_key_entities(entities):
+            print(f"    - [{sections[i]['title']}] No key error conditions or causes found. Skipping relationship mapping.")
+            continue
+        chunks.append(make_section_record(sections[i], texts[i], entities, relationships))
+    return chunks, {(sections[i]["doc"], sections[i]["title"]) for i in failed_sections}
+
+# --- Multi-Document Planning ---
+
+def plan_document(pdf_path):
+    """
+    Indexes one PDF and hashes its pages. Returns (doc, page hashes, planned sections), where each
+    section carries the content hash of its page range.
+    """
+    doc = os.path.basename(pdf_path)
+    doc_index = create_document_index(pdf_path, TI_MCU_CONFIG["index_keywords"])
+    if not doc_index: return doc, [], []
+    # Extracts every page once (or loads it from the page cache) before section workers start
+    hashes = page_hashes(pdf_path)
+    sections = [{"doc": doc, "pdf_path": pdf_path, "title": title, **pages,
+                 "section_hash": section_hash(hashes, pages["start_page"], pages["end_page"])}
+                for title, pages in doc_index.items()]
+    return doc, hashes, sections
+
+def changed_pages(previous_hashes, hashes):
+    """1-based numbers of pages added or changed since the previous manifest."""
+    return [i + 1 for i, digest in enumerate(hashes) if i >= len(previous_hashes) or previous_hashes[i] != digest]
 
-        all_chunk_data.append({
-            "title": section_title,
-            "source_text": text_chunk, # ⭐ ADDED: Store the raw text for contextual analysis
-            "entities": entities,
-            "relationships": relationships
-        })
+# --- Main Execution ---
 
-        with open(INTERMEDIATE_FILE, 'w') as f:
-            json.dump(all_chunk_data, f, indent=2)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract a CVOT from one or more TI MCU technical manuals.")
+    parser.add_argument("--pdf", action="append", help="PDF to ingest (repeatable). Defaults to PDF_PATH.")
+    parser.add_argument("--pdf-dir", default=PDF_DIR, help="Ingest every *.pdf in this directory.")
+    parser.add_argument("--batch", action="store_true", help="Use the Message Batches API instead of live requests (slower, cheaper, higher throughput).")
+    parser.add_argument("--merge", nargs="+", metavar="CVOT_JSON", help="Merge existing per-document CVOT files into OUTPUT_FILE instead of extracting.")
+    args = parser.parse_args()
+
+    if args.merge:
+        print(f"--- Merging {len(args.merge)} CVOT files ---")
+        cvots = []
+        for path in args.merge:
+            with open(path, 'r') as f:
+                cvots.append(json.load(f))
+        merged_cvot = merge_cvots(cvots)
+        if RESOLVE_ENTITIES:
+            merged_cvot = resolve_entities(merged_cvot)
+        with open(OUTPUT_FILE, 'w') as f:
+            json.dump(merged_cvot, f, indent=2)
+        print(f"Merged {sum(len(nodes) for nodes in merged_cvot['nodes'].values())} nodes and "
+              f"{sum(len(vectors) for vectors in merged_cvot['causal_vectors'].values())} causal vectors into {OUTPUT_FILE}")
+        exit()
+
+    pdf_paths = args.pdf or ([PDF_PATH] if not args.pdf_dir else sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))))
+    print(f"--- Starting MCU Knowledge Extraction ({len(pdf_paths)} documents) ---")
+    # PyMuPDF is not thread-safe and small manuals are extracted in-process, so each document is planned
+    # in its own process; page texts and indexes reach the section workers through the on-disk caches
+    with ProcessPoolExecutor(max_workers=min(DOC_WORKERS, len(pdf_paths)) or 1) as executor:
+        plans = list(executor.map(plan_document, pdf_paths))
+    if not any(sections for _, _, sections in plans):
+        print("\n--- No relevant sections found. Exiting. ---")
+        exit()
 
+    recorded, manifest = {}, {}
+    if RESUME_PROCESSING:
+        migrate_legacy_checkpoint(LEGACY_INTERMEDIATE_FILE, INTERMEDIATE_FILE)
+        if os.path.exists(INTERMEDIATE_FILE):
+            print("\n--- Found existing processed data. Loading... ---")
+            repair_checkpoint(INTERMEDIATE_FILE)
+            assign_legacy_records(INTERMEDIATE_FILE, os.path.basename(PDF_PATH))  # Single-document checkpoints came from PDF_PATH
+            recorded = index_records(INTERMEDIATE_FILE)
+        manifest = load_manifest(MANIFEST_FILE)
+    elif os.path.exists(INTERMEDIATE_FILE):
+        os.remove(INTERMEDIATE_FILE)  # Fresh run: start a new checkpoint
+
+    # A section is re-extracted only if it has no record yet or its pages' content hash changed.
+    # Records from before hashes were tracked are compared via the manifest, or adopted on first sight.
+    pending = []
+    for doc, hashes, sections in plans:
+        previous = manifest.get(doc, {})
+        if previous.get("page_hashes"):
+            pages = changed_pages(previous["page_hashes"], hashes)
+            print(f"\n--- {doc}: {len(pages)} of {len(hashes)} pages changed since the last run ---")
+        for section in sections:
+            key = (doc, section["title"])
+            if key in recorded:
+                previous_hash = recorded[key][1] or previous.get("sections", {}).get(section["title"], {}).get("section_hash") or section["section_hash"]
+                if previous_hash == section["section_hash"]:
+                    print(f"\n>>> Skipping unchanged section: '{section['title']}' ({doc})")
+                    continue
+                print(f"\n>>> Section pages changed, re-extracting: '{section['title']}' ({doc})")
+            pending.append(section)
+
+    def checkpoint_section(section, chunk):
+        """Records a finished section; chunk is None only when extraction succeeded and found nothing."""
+        if chunk is None:
+            if (section["doc"], section["title"]) not in recorded: return
+            # The section's pages changed and it no longer yields entities; an empty record supersedes the stale one.
+            # Sections whose LLM calls failed never get here, so their previous record stays until a retry succeeds
+            chunk = make_section_record(section, "", {}, {})
+        append_record(INTERMEDIATE_FILE, chunk)
+
+    if args.batch:
+        records, failed = process_sections_in_batches(pending)
+        chunks = {(chunk["doc"], chunk["title"]): chunk for chunk in records}
+        for section in pending:
+            if (section["doc"], section["title"]) in failed: continue
+            checkpoint_section(section, chunks.get((section["doc"], section["title"])))
+    else:
+        # Sections from every document share one pool; each finished one is appended to the
+        # checkpoint immediately, so a crash loses at most the sections still in flight
+        checkpoint_lock = threading.Lock()
+        print(f"\n--- Processing {len(pending)} sections with {MAX_WORKERS} workers ---")
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {executor.submit(process_section, section): section for section in pending}
+            for future in as_completed(futures):
+                try:
+                    chunk = future.result()
+                except Exception as e:
+                    print(f"    - ERROR processing section '{futures[future]['title']}': {e}")
+                    continue
+                with checkpoint_lock:
+                    checkpoint_section(futures[future], chunk)
+
+    for doc, hashes, sections in plans:
+        manifest[doc] = {
+            "page_hashes": hashes,
+            "sections": {section["title"]: {"start_page": section["start_page"], "end_page": section["end_page"],
+                                            "section_hash": section["section_hash"]} for section in sections},
+        }
+    save_manifest(MANIFEST_FILE, manifest)
+
+    # Records are streamed from the checkpoint in document and index order, so node ids don't depend on
+    # completion order; a re-extracted section's latest record replaces its old nodes and edges
     print("\n--- Assembling Final CVOT ---")
-    final_cvot = build_final_cvot(all_chunk_data, TI_MCU_CONFIG)
+    order = [(section["doc"], section["title"]) for _, _, sections in plans for section in sections]
+    planned = set(order)
+    unplanned = [key for key in index_records(INTERMEDIATE_FILE) if key not in planned]
+    if unplanned:
+        # e.g. sections renamed or regrouped by a planner change; only the current plan's sections reach the CVOT
+        print(f"  - {len(unplanned)} checkpoint records are not in the current plan and were left out of the CVOT:")
+        for doc, title in unplanned:
+            print(f"    - '{title}' ({doc})")
+    final_cvot = build_final_cvot(iter_latest_records(INTERMEDIATE_FILE, order=order), TI_MCU_CONFIG)
+    if RESOLVE_ENTITIES:
+        final_cvot = resolve_entities(final_cvot)
     with open(OUTPUT_FILE, 'w') as f:
         json.dump(final_cvot, f, indent=2)
 
     print("\n--- Extraction Complete ---")
+    response_cache.report()
     print(f"Generated intermediate file: {INTERMEDIATE_FILE}")
-    print(f"Generated final CVOT file: {OUTPUT_FILE}")
\ No newline at end of file
+    print(f"Generated final CVOT file: {OUTPUT_FILE}")
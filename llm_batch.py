@@ -0,0 +1,58 @@
+import os
+import time
+
+from llm_cache import response_cache, store_response
+from llm_client import call_with_retries
+
+# --- Configuration ---
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "30"))  # Seconds between status checks
+MAX_REQUESTS_PER_BATCH = 10000  # Larger workloads are split across several batch jobs
+
+def batch_request(custom_id, model, system_prompt, user_prompt, max_tokens=4000, temperature=0.1):
+    """Builds one Message Batches request entry; custom_id must match [a-zA-Z0-9_-]{1,64}."""
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": model, "max_tokens": max_tokens, "temperature": temperature,
+            "system": system_prompt, "messages": [{"role": "user", "content": user_prompt}],
+        },
+    }
+
+def run_batch(client, requests, label="batch", poll_interval=BATCH_POLL_INTERVAL, cache=response_cache):
+    """
+    Submits requests through the Message Batches API, polls until every job has ended and
+    returns {custom_id: response text}. Failed, expired or canceled requests map to None.
+    Requests already in the LLM response cache are answered from it and never submitted; like
+    cached_create(), finished replies are stored there.
+    """
+    if not requests: return {}
+    results = {request["custom_id"]: cache.get(request["params"]) for request in requests}
+    params_by_id = {request["custom_id"]: request["params"] for request in requests}
+    requests = [request for request in requests if results[request["custom_id"]] is None]
+    if len(requests) < len(results):
+        print(f"  - [{label}] {len(results) - len(requests)} requests answered from the LLM cache.")
+
+    batch_ids = []
+    for start in range(0, len(requests), MAX_REQUESTS_PER_BATCH):
+        batch = call_with_retries(client.messages.batches.create, requests=requests[start:start + MAX_REQUESTS_PER_BATCH])
+        batch_ids.append(batch.id)
+        print(f"  - [{label}] Submitted batch {batch.id} with {len(requests[start:start + MAX_REQUESTS_PER_BATCH])} requests.")
+
+    for batch_id in batch_ids:
+        while True:
+            batch = call_with_retries(client.messages.batches.retrieve, batch_id)
+            if batch.processing_status == "ended": break
+            counts = batch.request_counts
+            print(f"  - [{label}] Batch {batch_id} {batch.processing_status}: {counts.processing} processing, "
+                  f"{counts.succeeded} succeeded, {counts.errored} errored.")
+            time.sleep(poll_interval)
+
+        for entry in call_with_retries(client.messages.batches.results, batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = store_response(params_by_id[entry.custom_id], entry.result.message, cache)
+            else:
+                error = getattr(entry.result, "error", None)
+                print(f"  - [{label}] Request {entry.custom_id} {entry.result.type}{f': {error}' if error else ''}")
+    succeeded = sum(1 for text in results.values() if text is not None)
+    print(f"  - [{label}] {succeeded}/{len(results)} requests succeeded.")
+    return results
@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from llm_client import create_message
+from storage import execute_sql
+
+# --- Configuration ---
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # Least recently used responses are evicted past this
+LLM_CACHE_MODE = os.getenv("LLM_CACHE", "on").lower()  # on | refresh (ignore stored responses, store new ones) | off
+EVICT_CHUNK_SIZE = 500  # Keys per DELETE, well under SQLite's bound-variable limit
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created_at REAL, last_used REAL)",
+    "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)",
+)
+
+# Only the fields that determine the model's output are part of the key
+KEY_FIELDS = ("model", "system", "messages", "temperature", "max_tokens")
+
+def cache_key(params):
+    """SHA-256 over the output-determining request parameters, so identical prompts share one entry."""
+    keyed = {field: params.get(field) for field in KEY_FIELDS}
+    return hashlib.sha256(json.dumps(keyed, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """
+    On-disk cache of LLM response text keyed by cache_key(), shared by every pipeline script.
+    The database is capped at max_bytes of response text with least-recently-used eviction.
+    """
+
+    def __init__(self, db_path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES, mode=LLM_CACHE_MODE):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _db(self, sql, params=()):
+        """Runs one statement against the cache database (creating the schema on first use) and returns all rows."""
+        rows = execute_sql(self.db_path, sql, params, setup=() if self._ready else SCHEMA)
+        self._ready = True
+        return rows
+
+    def get(self, params):
+        """Returns the cached response text for a request, or None on a miss (always None unless mode is 'on')."""
+        if self.mode != "on": return None
+        key = cache_key(params)
+        with self._lock:
+            rows = self._db("SELECT response FROM responses WHERE key = ?", (key,))
+            if not rows:
+                self.misses += 1
+                return None
+            self._db("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return rows[0][0]
+
+    def put(self, params, response_text):
+        """Stores a response, then evicts least recently used entries until the cache fits max_bytes."""
+        if self.mode == "off" or response_text is None: return
+        now, size = time.time(), len(response_text.encode("utf-8"))
+        with self._lock:
+            self._db("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                     (cache_key(params), params.get("model"), response_text, size, now, now))
+            self.writes += 1
+            self._evict()
+
+    def _evict(self):
+        total = self._db("SELECT COALESCE(SUM(size), 0) FROM responses")[0][0]
+        if total <= self.max_bytes: return
+        excess, doomed = total - self.max_bytes, []
+        for key, size in self._db("SELECT key, size FROM responses ORDER BY last_used"):
+            if excess <= 0: break
+            doomed.append(key)
+            excess -= size
+        for start in range(0, len(doomed), EVICT_CHUNK_SIZE):
+            chunk = doomed[start:start + EVICT_CHUNK_SIZE]
+            self._db(f"DELETE FROM responses WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        self.evictions += len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._db("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses")[0]
+            lookups = self.hits + self.misses
+            return {
+                "mode": self.mode, "hits": self.hits, "misses": self.misses, "writes": self.writes,
+                "evictions": self.evictions, "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": entries, "bytes": total, "max_bytes": self.max_bytes,
+            }
+
+    def report(self):
+        """Prints this run's hit statistics."""
+        s = self.stats()
+        print(f"  - LLM cache ({s['mode']}): {s['hits']} hits, {s['misses']} misses (hit rate {s['hit_rate']:.0%}), "
+              f"{s['writes']} writes, {s['evictions']} evictions; {s['entries']} entries, {s['bytes'] / 1e6:.1f}/{s['max_bytes'] / 1e6:.0f} MB")
+
+# Shared instance used by cached_create() and run_batch()
+response_cache = LLMResponseCache()
+
+# --- Cached Requests ---
+
+def store_response(params, message, cache=response_cache):
+    """Caches a finished message's text and returns it. A reply cut off at max_tokens is never replayed from the cache."""
+    response_text = message.content[0].text
+    if message.stop_reason != "max_tokens":
+        cache.put(params, response_text)
+    return response_text
+
+def cached_create(client, params, cache=response_cache):
+    """
+    Returns the response text for a messages.create request, answering from the cache when it can
+    and caching what the API returns. API errors (after create_message's retries) propagate.
+    """
+    cached = cache.get(params)
+    if cached is not None: return cached
+    return store_response(params, create_message(client, **params), cache)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the on-disk LLM response cache.")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached response.")
+    args = parser.parse_args()
+    if args.clear:
+        response_cache.clear()
+        print(f"Cleared {LLM_CACHE_PATH}.")
+    print(json.dumps(response_cache.stats(), indent=2))
@@ -0,0 +1,81 @@
+import os
+import random
+import threading
+import time
+
+import anthropic
+
+# --- Configuration ---
+MAX_CONCURRENT_REQUESTS = int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", "4"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+BASE_RETRY_DELAY = 1.0  # Seconds, doubled on every attempt
+MAX_RETRY_DELAY = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Shared by every worker thread: caps in-flight requests and, after a 429, holds all of them
+# back until the server's retry-after has passed instead of letting each one hit the limit again
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+_pause_lock = threading.Lock()
+_paused_until = 0.0
+
+def create_client():
+    """Anthropic client with SDK retries disabled, since create_message() handles them."""
+    return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), base_url=os.getenv("ANTHROPIC_BASE_URL"), max_retries=0)
+
+def retry_after_seconds(error):
+    """Reads the server's retry-after-ms / retry-after header from an API error, if present."""
+    response = getattr(error, "response", None)
+    if response is None: return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None  # HTTP-date form; fall back to exponential backoff
+    return None
+
+def is_retryable(error):
+    if isinstance(error, (anthropic.APIConnectionError, anthropic.APITimeoutError)): return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt))
+
+def _wait_for_pause():
+    delay = _paused_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def _pause_all(seconds):
+    global _paused_until
+    with _pause_lock:
+        _paused_until = max(_paused_until, time.monotonic() + seconds)
+
+def call_with_retries(fn, *args, **kwargs):
+    """
+    Calls an Anthropic API function with bounded concurrency, honouring retry-after on rate limits
+    and retrying transient failures with exponential backoff and jitter. Re-raises the last error.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        _wait_for_pause()
+        try:
+            with _request_slots:
+                return fn(*args, **kwargs)
+        except anthropic.APIError as e:
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = retry_after_seconds(e)
+            if delay is not None:
+                _pause_all(delay)
+                delay += random.uniform(0, BASE_RETRY_DELAY)  # Jitter so paused workers don't resume in lockstep
+            else:
+                delay = backoff_delay(attempt)
+            print(f"    - LLM request failed ({e.__class__.__name__}), retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+def create_message(client, **params):
+    """client.messages.create() with the retry and concurrency handling of call_with_retries()."""
+    return call_with_retries(client.messages.create, **params)
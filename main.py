@@ -1,8 +1,20 @@
 import os
 import json
+import gzip
+import hashlib
+import threading
+import time
+from collections import namedtuple
 import anthropic
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
 from dotenv import load_dotenv
+from answer_cache import AnswerCache
+from cvot_index import build_graph_index, diagnose_error, estimate_tokens, find_diagnosis_paths, search_nodes, select_relevant_context
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Brotli is optional; gzip is always served when the client accepts it
 
 load_dotenv()
 
@@ -11,18 +23,114 @@ app = Flask(__name__, template_folder='.')
 # --- Configuration ---
 CVOT_DATA_FILE = "ti_mcu_cvot_weighted.json"
 HTML_FILE = "ti_mcu_demo.html"
+CHAT_MODEL = "claude-sonnet-4-20250514"
+CHAT_MAX_TOKENS = 1024
+CHAT_CONTEXT_MODE = os.getenv("CHAT_CONTEXT_MODE", "scoped")  # "scoped" sends only the relevant subgraph, "full" sends the whole CVOT
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "6000"))
+MIN_CACHEABLE_TOKENS = 1024  # Shortest prompt prefix the provider will cache for CHAT_MODEL; shorter marked prefixes are never cached
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # Seconds
+ANSWER_CACHE_DB = os.getenv("ANSWER_CACHE_DB")  # e.g. "answer_cache.sqlite3" to keep answers across restarts
+CVOT_WATCH_INTERVAL = float(os.getenv("CVOT_WATCH_INTERVAL", "2"))  # Seconds between file checks, 0 disables
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Required for /api/admin/reload from non-local clients
+
+CVOTSnapshot = namedtuple("CVOTSnapshot", ["data", "index", "payload", "signature"])
+
+def build_cvot_payload(data):
+    """Serializes and compresses the CVOT once so /api/cvot only has to pick a variant."""
+    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    payload = {
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=9),
+        "etag": hashlib.sha256(body).hexdigest(),
+    }
+    if brotli is not None:
+        payload["br"] = brotli.compress(body, quality=11)
+    return payload
+
+def file_signature(path):
+    """Returns (mtime_ns, size) for change detection, or None if the file is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def check_cvot_shape(data):
+    """Raises ValueError unless data has the top-level CVOT shape the indexes rely on."""
+    if not isinstance(data, dict):
+        raise ValueError(f"CVOT must be a JSON object, not {type(data).__name__}")
+    for section in ("nodes", "causal_vectors"):
+        groups = data.get(section, {})
+        if not isinstance(groups, dict) or not all(isinstance(items, list) and all(isinstance(item, dict) for item in items) for items in groups.values()):
+            raise ValueError(f"CVOT '{section}' must map each type to a list of objects")
+
+def load_snapshot(path):
+    """Parses and indexes a CVOT file into a snapshot. Raises if the file cannot be loaded."""
+    signature = file_signature(path)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    check_cvot_shape(data)
+    # Build lookup indexes once so each request only touches the relevant part of the graph
+    return CVOTSnapshot(data, build_graph_index(data), build_cvot_payload(data), signature)
 
 # Load the master CVOT data once on startup
 try:
-    with open(CVOT_DATA_FILE, 'r') as f:
-        cvot_data = json.load(f)
+    snapshot = load_snapshot(CVOT_DATA_FILE)
     print(f"Successfully loaded CVOT data from {CVOT_DATA_FILE}")
-except (FileNotFoundError, json.JSONDecodeError) as e:
+except Exception as e:  # Same breadth as reload_cvot: a malformed node must not stop the app from starting
     print(f"FATAL ERROR: Could not load or parse {CVOT_DATA_FILE}: {e}")
-    cvot_data = {} # Start with empty data to avoid crashing the server
+    # Start with empty data to avoid crashing the server; the watcher picks up a valid file later
+    snapshot = CVOTSnapshot({}, build_graph_index({}), build_cvot_payload({}), None)
+
+# Repeated questions are answered from cache; answers are tied to the CVOT content hash
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_DB)
+answer_cache.set_version(snapshot.payload["etag"])
+
+# --- Hot Reload ---
+_reload_lock = threading.Lock()
+_failed_signature = None
+
+def reload_cvot(reason):
+    """
+    Loads and indexes the CVOT file off the request path, then swaps the snapshot in one assignment.
+    Requests read `snapshot` once, so they always see a single consistent version. On failure the
+    current snapshot stays in place. Returns (reloaded, message).
+    """
+    global snapshot, _failed_signature
+    with _reload_lock:
+        try:
+            new_snapshot = load_snapshot(CVOT_DATA_FILE)
+        except Exception as e:  # Any bad file must leave the current snapshot serving
+            _failed_signature = file_signature(CVOT_DATA_FILE)
+            print(f"ERROR: Reload of {CVOT_DATA_FILE} ({reason}) failed, keeping version {snapshot.payload['etag'][:12]}: {e}")
+            return False, str(e)
+        _failed_signature = None
+        if new_snapshot.payload["etag"] == snapshot.payload["etag"]:
+            snapshot = new_snapshot  # Same content; just remember the new file signature
+            return False, "unchanged"
+        snapshot = new_snapshot
+        answer_cache.set_version(new_snapshot.payload["etag"])
+        print(f"Reloaded {CVOT_DATA_FILE} ({reason}): now serving version {new_snapshot.payload['etag'][:12]}")
+        return True, "reloaded"
+
+def watch_cvot_file(interval):
+    """Polls the CVOT file and reloads it whenever its modification time or size changes."""
+    while True:
+        time.sleep(interval)
+        try:
+            signature = file_signature(CVOT_DATA_FILE)
+            if signature and signature != snapshot.signature and signature != _failed_signature:
+                reload_cvot("file changed")
+        except Exception as e:  # Never let one bad poll stop hot reload for the life of the process
+            print(f"ERROR: CVOT watcher poll failed: {e}")
+
+if CVOT_WATCH_INTERVAL > 0:
+    threading.Thread(target=watch_cvot_file, args=(CVOT_WATCH_INTERVAL,), daemon=True, name="cvot-watcher").start()
 
 # --- Anthropic API Client ---
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# ANTHROPIC_BASE_URL can point at a local stub (see stub_anthropic_server.py) for testing
+client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), base_url=os.getenv("ANTHROPIC_BASE_URL"))
 
 # --- System Prompt for the Chat Assistant (TI MCU Version) ---
 CHAT_SYSTEM_PROMPT = """You are an expert AI assistant specializing in Texas Instruments C2000 microcontroller troubleshooting.
@@ -43,8 +151,113 @@ def home():
 
 @app.route('/api/cvot', methods=['GET'])
 def get_cvot_data():
-    """Provides the full CVOT JSON to the frontend."""
-    return jsonify(cvot_data)
+    """Provides the full CVOT JSON to the frontend from the pre-serialized payload."""
+    cvot_payload = snapshot.payload
+    if request.if_none_match.contains(cvot_payload["etag"]):
+        response = Response(status=304)
+    else:
+        encoding = "identity"
+        if "br" in cvot_payload and request.accept_encodings["br"]:
+            encoding = "br"
+        elif request.accept_encodings["gzip"]:
+            encoding = "gzip"
+        response = Response(cvot_payload[encoding], mimetype="application/json")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(cvot_payload["etag"])
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"  # Always revalidate, the ETag makes that a cheap 304
+    return response
+
+@app.route('/api/diagnosis/<node_id>', methods=['GET'])
+def get_diagnosis(node_id):
+    """Returns the weight-sorted causes and deduplicated solutions for an error condition."""
+    diagnosis = diagnose_error(snapshot.index, node_id)
+    if diagnosis is None:
+        return jsonify({"error": f"Unknown error condition: {node_id}"}), 404
+    return jsonify(diagnosis)
+
+@app.route('/api/paths', methods=['GET'])
+def get_diagnosis_paths():
+    """Top-k indicator -> error -> cause -> solution paths, e.g. /api/paths?start=XRSn+bit+in+RESC+register&k=5."""
+    start = request.args.get("start", "").strip()
+    if not start:
+        return jsonify({"error": "Missing query parameter 'start'."}), 400
+    k = min(max(request.args.get("k", 5, type=int), 1), 50)
+
+    result = find_diagnosis_paths(snapshot.index, start, k)
+    if result is None:
+        return jsonify({"error": f"No indicator, error or cause matches: {start}"}), 404
+    return jsonify(result)
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Ranked full-text search over all CVOT nodes, e.g. /api/search?q=watchdog+reset&k=10&type=error_conditions."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing query parameter 'q'."}), 400
+    k = min(max(request.args.get("k", 10, type=int), 1), 100)
+    node_types = request.args.getlist("type") or None
+
+    started = time.perf_counter()
+    results = search_nodes(snapshot.index, query, k, node_types)
+    return jsonify({"query": query, "results": results, "took_ms": round((time.perf_counter() - started) * 1000, 3)})
+
+def build_chat_request(user_message):
+    """
+    Builds the messages.create arguments for a question, plus stats on the context it carries.
+    A prefix is only marked for prompt caching once it reaches MIN_CACHEABLE_TOKENS: the system prompt
+    alone (~300 tokens) is too short, so in scoped mode no marker is sent at all.
+    """
+    current = snapshot
+    # Provide only the error/indicator neighbourhood relevant to the question, or the full CVOT if configured
+    if CHAT_CONTEXT_MODE == "full":
+        context = current.index["full_context"]
+        context_stats = {"mode": "full", "reason": "configured"}
+    else:
+        context, context_stats = select_relevant_context(current.index, user_message, CHAT_CONTEXT_TOKEN_BUDGET)
+        print(f"Chat context ({context_stats['mode']}): ~{context_stats['context_tokens']} of ~{context_stats['full_tokens']} tokens, "
+              f"trimmed {context_stats['trimmed_pct']}%")
+    context_stats["cvot_version"] = current.payload["etag"]
+
+    # Static prefix first (system prompt, then knowledge base) so the provider can reuse it across
+    # requests; the user's question always comes last. Only the full dump repeats between questions:
+    # a scoped subgraph differs per question, so marking it would pay the cache-write premium for nothing
+    system = {"type": "text", "text": CHAT_SYSTEM_PROMPT}
+    knowledge_base = {"type": "text", "text": f"Here is the knowledge base I have available in JSON format:\n{context}"}
+    prefix_tokens = estimate_tokens(system["text"])
+    if prefix_tokens >= MIN_CACHEABLE_TOKENS:
+        system["cache_control"] = {"type": "ephemeral"}
+    if context_stats["mode"] == "full" and prefix_tokens + estimate_tokens(knowledge_base["text"]) >= MIN_CACHEABLE_TOKENS:
+        knowledge_base["cache_control"] = {"type": "ephemeral"}
+    chat_kwargs = {
+        "model": CHAT_MODEL,
+        "max_tokens": CHAT_MAX_TOKENS,
+        "system": [system],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    knowledge_base,
+                    {
+                        "type": "text",
+                        "text": f"Based on this information, please answer my question: '{user_message}'"
+                    }
+                ]
+            }
+        ]
+    }
+    return chat_kwargs, context_stats
+
+def log_prompt_cache_usage(usage):
+    """Logs prompt-cache read/write token counts so the savings show up in the server log."""
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    print(f"Chat usage: input={usage.input_tokens} cache_read={cache_read} cache_write={cache_write} output={usage.output_tokens}")
+
+def format_sse(event, data):
+    """Formats one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -53,29 +266,83 @@ def chat():
     if not user_message:
         return jsonify({"reply": "Invalid message received."}), 400
 
-    # For the chat, provide the full CVOT as context
-    # In a larger application, you might provide only relevant excerpts
-    context = json.dumps(cvot_data, indent=2)
+    cached_reply = answer_cache.get(user_message)
+    if cached_reply is not None:
+        return jsonify({"reply": cached_reply, "cached": True})
 
+    chat_kwargs, context_stats = build_chat_request(user_message)
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            system=CHAT_SYSTEM_PROMPT,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Here is the knowledge base I have available in JSON format:\n{context}\n\nBased on this information, please answer my question: '{user_message}'"
-                }
-            ]
-        )
+        response = client.messages.create(**chat_kwargs)
+        log_prompt_cache_usage(response.usage)
         reply = response.content[0].text
-        return jsonify({"reply": reply})
+        answer_cache.put(user_message, reply, context_stats["cvot_version"])
+        return jsonify({"reply": reply, "context": context_stats})
 
     except Exception as e:
         print(f"Error calling Anthropic API: {e}")
         return jsonify({"reply": "Sorry, I'm having trouble connecting to my brain right now."}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streams the chat reply to the browser token by token as Server-Sent Events."""
+    user_message = request.json.get("message")
+    if not user_message:
+        return jsonify({"reply": "Invalid message received."}), 400
+
+    cached_reply = answer_cache.get(user_message)
+    if cached_reply is not None:
+        return Response(format_sse("delta", {"text": cached_reply}) + format_sse("done", {"cached": True}),
+                        mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    chat_kwargs, context_stats = build_chat_request(user_message)
+
+    def generate():
+        yield format_sse("context", context_stats)
+        completed = False
+        parts = []
+        try:
+            # Leaving this block for any reason closes the upstream HTTP stream, so a browser
+            # disconnect (GeneratorExit raised at a yield) stops generation immediately
+            with client.messages.stream(**chat_kwargs) as stream:
+                for text in stream.text_stream:
+                    parts.append(text)
+                    yield format_sse("delta", {"text": text})
+                log_prompt_cache_usage(stream.get_final_message().usage)
+            completed = True
+            answer_cache.put(user_message, "".join(parts), context_stats["cvot_version"])
+            yield format_sse("done", {})
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            print(f"Error streaming from Anthropic API: {e}")
+            yield format_sse("error", {"reply": "Sorry, I'm having trouble connecting to my brain right now."})
+            completed = True
+        finally:
+            if not completed:
+                print("Chat stream closed by client; cancelled upstream generation.")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/chat/cache', methods=['GET'])
+def get_answer_cache_stats():
+    """Reports answer cache hit/miss counters."""
+    return jsonify(answer_cache.stats())
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reloads the CVOT file on demand, e.g. right after update_weights.py finishes."""
+    if ADMIN_TOKEN:
+        if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return jsonify({"error": "Invalid admin token."}), 403
+    elif request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Set ADMIN_TOKEN to allow remote reloads."}), 403
+
+    reloaded, message = reload_cvot("admin request")
+    status = 500 if not reloaded and message != "unchanged" else 200
+    return jsonify({"reloaded": reloaded, "message": message, "version": snapshot.payload["etag"]}), status
+
 if __name__ == '__main__':
-    # Use Gunicorn or another production server in a real deployment
+    # Use Gunicorn or another production server in a real deployment,
+    # or `uvicorn asgi_app:app` to serve chats asynchronously with bounded LLM concurrency
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from cvot_index import tokenize
+from pdf_pages import PAGES_PER_TASK, PARALLEL_PAGE_THRESHOLD, load_page_texts, pdf_content_hash
+from storage import atomic_write
+
+# --- Configuration ---
+PAGE_INDEX_SUFFIX = ".pageindex.json"  # Cached next to the PDF, e.g. mspm0c1104.pageindex.json
+MIN_PAGE_HITS = 3  # Keyword occurrences a page needs before it is considered relevant
+MAX_PAGE_GAP = 1  # Relevant pages separated by at most this many irrelevant pages form one section
+
+_memory_cache = {}  # pdf content hash -> page index
+
+def _index_page_range(first_page, texts):
+    """Counts terms on a run of pages (runs in worker processes). Returns {term: [[page, count], ...]}."""
+    postings = {}
+    for page_num, text in enumerate(texts, first_page):
+        for term, count in Counter(tokenize(text)).items():
+            postings.setdefault(term, []).append([page_num, count])
+    return postings
+
+def build_page_index(pdf_path, workers=None):
+    """Builds a term -> [[1-based page, count], ...] inverted index over every page in one pass."""
+    pages = load_page_texts(pdf_path)
+    if len(pages) < PARALLEL_PAGE_THRESHOLD:
+        return _index_page_range(1, pages)
+
+    starts = list(range(0, len(pages), PAGES_PER_TASK))
+    print(f"    - Indexing {len(pages)} pages across a process pool...")
+    postings = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Ranges come back in page order, so every posting list stays sorted by page
+        for partial in executor.map(_index_page_range, [start + 1 for start in starts], [pages[start:start + PAGES_PER_TASK] for start in starts]):
+            for term, entries in partial.items():
+                postings.setdefault(term, []).extend(entries)
+    return postings
+
+def load_page_index(pdf_path, workers=None):
+    """Returns the page index for a PDF, building it once per PDF version and caching it next to the PDF."""
+    content_hash = pdf_content_hash(pdf_path)
+    if content_hash in _memory_cache: return _memory_cache[content_hash]
+
+    cache_path = os.path.splitext(pdf_path)[0] + PAGE_INDEX_SUFFIX
+    index = None
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached.get("pdf_sha256") == content_hash:
+            index = cached
+    if index is None:
+        index = {"pdf_sha256": content_hash, "page_count": len(load_page_texts(pdf_path)), "postings": build_page_index(pdf_path, workers)}
+        with atomic_write(cache_path) as f:
+            json.dump(index, f)
+    _memory_cache[content_hash] = index
+    return index
+
+def find_relevant_pages(index, keywords, min_hits=MIN_PAGE_HITS):
+    """
+    Returns {page: hits} for pages where the keywords occur at least min_hits times. Keyword terms
+    match as prefixes ('troubleshoot' matches 'troubleshooting'); a multi-word keyword such as
+    'reset causes' only counts on pages containing all of its terms.
+    """
+    postings = index["postings"]
+    hits = Counter()
+    for keyword in keywords:
+        term_pages = []
+        for term in tokenize(keyword):
+            pages = Counter()
+            for indexed_term in postings:
+                if indexed_term.startswith(term):
+                    pages.update({page: count for page, count in postings[indexed_term]})
+            term_pages.append(pages)
+        if not term_pages: continue
+        shared = set(term_pages[0]).intersection(*term_pages[1:])
+        for page in shared:
+            hits[page] += min(pages[page] for pages in term_pages)
+    return {page: count for page, count in hits.items() if count >= min_hits}
+
+def group_pages_into_sections(pages, toc=(), max_gap=MAX_PAGE_GAP):
+    """
+    Groups relevant page numbers into contiguous sections, titling each after the TOC entry that
+    covers its first page (if any). Returns {title: {"start_page": ..., "end_page": ...}}.
+    """
+    runs = []
+    for page in sorted(pages):
+        if runs and page - runs[-1][1] <= max_gap + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+
+    toc_starts = sorted((page_num, title) for _, title, page_num in toc if page_num > 0)
+    sections = {}
+    for start, end in runs:
+        covering = [title for page_num, title in toc_starts if page_num <= start]
+        title = f"{covering[-1]} (pp. {start}-{end})" if covering else f"Pages {start}-{end}"
+        sections[title] = {"start_page": start, "end_page": end}
+    return sections
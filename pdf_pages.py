@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from storage import atomic_write
+
+# --- Configuration ---
+PAGE_CACHE_DIR = ".page_cache"
+PARALLEL_PAGE_THRESHOLD = 200  # Manuals with fewer pages are extracted in-process
+PAGES_PER_TASK = 100
+
+_memory_cache = {}  # pdf content hash -> list of page texts
+_hash_cache = {}  # (path, mtime_ns, size) -> pdf content hash
+_memory_lock = threading.Lock()  # Guards _memory_cache and _hash_locks only, never an extraction
+_hash_locks = {}  # pdf content hash -> lock held while that PDF is loaded, so different PDFs load concurrently
+
+def pdf_content_hash(pdf_path):
+    """SHA-256 of the PDF bytes, so a revised datasheet never reuses stale page text."""
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+    if key in _hash_cache: return _hash_cache[key]
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+def _extract_page_range(pdf_path, start, end):
+    """Extracts pages [start, end) with a single open of the document (runs in worker processes)."""
+    with fitz.open(pdf_path) as doc:
+        return [doc[page_num].get_text("text") for page_num in range(start, min(end, doc.page_count))]
+
+def _extract_all_pages(pdf_path, workers=None):
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_PAGE_THRESHOLD:
+            return [doc[page_num].get_text("text") for page_num in range(page_count)]
+
+    ranges = [(start, start + PAGES_PER_TASK) for start in range(0, page_count, PAGES_PER_TASK)]
+    print(f"    - Extracting {page_count} pages across a process pool...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = executor.map(_extract_page_range, [pdf_path] * len(ranges), *zip(*ranges))
+        return [text for chunk in chunks for text in chunk]
+
+def load_page_texts(pdf_path, cache_dir=PAGE_CACHE_DIR, workers=None):
+    """
+    Returns the text of every page, extracting each page exactly once per PDF version.
+    Results are kept in memory and persisted under cache_dir keyed by the PDF content hash.
+    """
+    content_hash = pdf_content_hash(pdf_path)
+    with _memory_lock:
+        if content_hash in _memory_cache:
+            return _memory_cache[content_hash]
+        hash_lock = _hash_locks.setdefault(content_hash, threading.Lock())
+
+    # Concurrent callers for the same PDF wait for one extraction; other PDFs are not blocked
+    with hash_lock:
+        with _memory_lock:
+            if content_hash in _memory_cache:
+                return _memory_cache[content_hash]
+
+        cache_path = os.path.join(cache_dir, f"{content_hash}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                pages = json.load(f)
+        else:
+            pages = _extract_all_pages(pdf_path, workers)
+            os.makedirs(cache_dir, exist_ok=True)
+            with atomic_write(cache_path) as f:
+                json.dump(pages, f)
+        with _memory_lock:
+            _memory_cache[content_hash] = pages
+        return pages
+
+def get_section_text(pdf_path, start_page, end_page):
+    """Returns the text of 1-based pages start_page..end_page, assembled with a single join."""
+    pages = load_page_texts(pdf_path)
+    return "".join(f"{text}\n\n" for text in pages[max(start_page - 1, 0):end_page])
+
+def page_hashes(pdf_path):
+    """SHA-256 of each page's extracted text, so changes can be tracked page by page across revisions."""
+    return [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in load_page_texts(pdf_path)]
+
+def section_hash(hashes, start_page, end_page):
+    """Combined hash of a section's page range and its pages' hashes (1-based, inclusive)."""
+    combined = f"{start_page}-{end_page}:" + "".join(hashes[max(start_page - 1, 0):end_page])
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()
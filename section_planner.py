@@ -0,0 +1,144 @@
+import os
+
+from cvot_index import CHARS_PER_TOKEN
+
+# --- Configuration ---
+MAX_WHOLE_SECTION_PAGES = 40  # A matching heading spanning more pages contributes only its intro pages; matching children are planned on their own
+TARGET_SECTION_TOKENS = int(os.getenv("EXTRACTOR_SECTION_TARGET_TOKENS", "6000"))  # Adjacent small sections are merged up to this size
+
+def page_tokens(page_texts):
+    """Estimated LLM tokens per page (index 0 = page 1)."""
+    return [len(text) // CHARS_PER_TOKEN for text in page_texts]
+
+def range_tokens(tokens, start_page, end_page):
+    return sum(tokens[max(start_page - 1, 0):max(end_page, 0)])
+
+def toc_entries(toc, page_count):
+    """
+    Turns fitz TOC rows into entries with their real page extent: from their start page up to the
+    page before the next entry at the same or a higher level (at least their start page).
+    Each entry also records its parent's position, so ancestry can be checked.
+    """
+    entries, open_entries = [], []
+    for level, title, page_num in toc:
+        if page_num < 1: continue
+        while open_entries and entries[open_entries[-1]]["level"] >= level:
+            closed = entries[open_entries.pop()]
+            closed["end_page"] = max(page_num - 1, closed["start_page"])
+        entries.append({"level": level, "title": title, "start_page": page_num, "end_page": page_count,
+                        "parent": open_entries[-1] if open_entries else None, "first_child_page": None})
+        if open_entries and entries[open_entries[-1]]["first_child_page"] is None:
+            entries[open_entries[-1]]["first_child_page"] = page_num
+        open_entries.append(len(entries) - 1)
+    return entries
+
+def select_sections(entries, keywords, max_whole_pages=MAX_WHOLE_SECTION_PAGES):
+    """
+    Picks the page ranges of keyword-matching TOC entries. A matching entry covers its whole extent,
+    which makes its matching descendants redundant; only very broad headings (e.g. a whole chapter)
+    are limited to their intro pages, leaving their matching children to be planned individually.
+    Returns (sections, broad extents); the rest of each broad extent is covered by cover_remaining_pages().
+    """
+    whole, sections, broad = set(), [], []
+    for position, entry in enumerate(entries):
+        if not any(keyword in entry["title"].lower() for keyword in keywords): continue
+        ancestor = entry["parent"]
+        while ancestor is not None and ancestor not in whole:
+            ancestor = entries[ancestor]["parent"]
+        if ancestor is not None: continue  # Already covered by a matching ancestor
+
+        start, end = entry["start_page"], entry["end_page"]
+        if end - start + 1 > max_whole_pages and entry["first_child_page"] is not None:
+            broad.append({"title": entry["title"], "start_page": start, "end_page": end})
+            end = max(entry["first_child_page"] - 1, start)
+        else:
+            whole.add(position)
+        sections.append({"titles": [entry["title"]], "start_page": start, "end_page": end})
+    return sections, broad
+
+def cover_remaining_pages(sections, extents, tokens, target_tokens=TARGET_SECTION_TOKENS):
+    """
+    Sections for the pages of broad matching headings that no planned section covers (their
+    non-matching children), cut into runs of at most target_tokens so none is oversized.
+    """
+    covered = {page for section in sections for page in range(section["start_page"], section["end_page"] + 1)}
+    remaining = []
+    for extent in extents:
+        run = None
+        for page in range(extent["start_page"], extent["end_page"] + 1):
+            if page in covered:
+                run = None
+                continue
+            covered.add(page)
+            if run and range_tokens(tokens, run["start_page"], page) <= target_tokens:
+                run["end_page"] = page
+            else:
+                run = {"title": extent["title"], "start_page": page, "end_page": page}
+                remaining.append(run)
+    return [{"titles": [f"{run['title']} (pp. {run['start_page']}-{run['end_page']})"], "start_page": run["start_page"], "end_page": run["end_page"]}
+            for run in remaining]
+
+def make_non_overlapping(sections):
+    """Clips sections in page order so every page belongs to exactly one section; emptied ones are dropped."""
+    cover, last_page = [], 0
+    for section in sorted(sections, key=lambda s: (s["start_page"], -s["end_page"])):
+        start = max(section["start_page"], last_page + 1)
+        if start > section["end_page"]: continue
+        cover.append({**section, "start_page": start})
+        last_page = section["end_page"]
+    return cover
+
+def merge_small_sections(sections, tokens, target_tokens=TARGET_SECTION_TOKENS):
+    """Merges directly adjacent sections while their combined size stays within target_tokens."""
+    merged = []
+    for section in sections:
+        if merged:
+            previous = merged[-1]
+            if (section["start_page"] == previous["end_page"] + 1
+                    and range_tokens(tokens, previous["start_page"], section["end_page"]) <= target_tokens):
+                previous["titles"] = previous["titles"] + section["titles"]
+                previous["end_page"] = section["end_page"]
+                continue
+        merged.append(dict(section))
+    return merged
+
+def naive_sections(toc, page_count, keywords):
+    """The original flat index: every matching TOC row runs to the page before the next matching row."""
+    matches = sorted(({"title": title, "start_page": page_num} for _, title, page_num in toc
+                      if any(keyword in title.lower() for keyword in keywords)), key=lambda x: x["start_page"])
+    return [{"titles": [section["title"]], "start_page": section["start_page"],
+             "end_page": matches[i + 1]["start_page"] - 1 if i + 1 < len(matches) else page_count}
+            for i, section in enumerate(matches)]
+
+def plan_sections(toc, page_texts, keywords, target_tokens=TARGET_SECTION_TOKENS):
+    """
+    Plans the sections to extract from a document: a non-overlapping cover of the keyword-relevant
+    TOC extents with tiny neighbours merged, so each page is sent to the LLM at most once.
+    Returns ({title: {"start_page", "end_page"}}, report) where report compares it with the naive index,
+    separating overlap removed from pages left out because no matching heading covers them.
+    """
+    tokens = page_tokens(page_texts)
+    page_count = len(page_texts)
+    selected, broad = select_sections(toc_entries(toc, page_count), keywords)
+    cover = make_non_overlapping(selected)
+    cover = sorted(cover + cover_remaining_pages(cover, broad, tokens, target_tokens), key=lambda s: s["start_page"])
+    planned = merge_small_sections(cover, tokens, target_tokens)
+    planned = [section for section in planned if range_tokens(tokens, section["start_page"], section["end_page"]) > 0]
+
+    naive = naive_sections(toc, page_count, keywords)
+    naive_pages = {page for s in naive for page in range(s["start_page"], s["end_page"] + 1)}
+    planned_pages = {page for s in planned for page in range(s["start_page"], s["end_page"] + 1)}
+    dropped = naive_pages - planned_pages
+    report = {
+        "naive_sections": len(naive),
+        "naive_empty_sections": sum(1 for s in naive if range_tokens(tokens, s["start_page"], s["end_page"]) == 0),
+        "naive_tokens": sum(range_tokens(tokens, s["start_page"], s["end_page"]) for s in naive),
+        "overlap_tokens": sum(range_tokens(tokens, s["start_page"], s["end_page"]) for s in naive) - sum(tokens[page - 1] for page in naive_pages if 0 < page <= page_count),
+        "dropped_pages": len(dropped),  # Naive sections ran on past their heading into pages no matching heading covers
+        "dropped_tokens": sum(tokens[page - 1] for page in dropped if 0 < page <= page_count),
+        "planned_sections": len(planned),
+        "planned_pages": len(planned_pages),
+        "planned_tokens": sum(range_tokens(tokens, s["start_page"], s["end_page"]) for s in planned),
+    }
+    report["tokens_saved"] = report["naive_tokens"] - report["planned_tokens"]
+    return {" / ".join(s["titles"]): {"start_page": s["start_page"], "end_page": s["end_page"]} for s in planned}, report
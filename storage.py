@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- Atomic File Writes ---
+
+@contextmanager
+def atomic_write(path, encoding="utf-8", fsync=False):
+    """
+    Opens a temporary file next to path for writing and renames it over path once the block
+    completes, so readers (and a crash mid-write) never leave a half-written file behind.
+    The temporary name is unique per process and thread, so concurrent writers never share one.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding=encoding) as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# --- SQLite ---
+
+def execute_sql(db_path, sql, params=(), setup=(), timeout=30):
+    """
+    Runs one statement (after any setup statements, e.g. CREATE TABLE IF NOT EXISTS) as a transaction
+    in its own short-lived connection and returns all rows. A connection per call keeps it thread-safe.
+    """
+    db = sqlite3.connect(db_path, timeout=timeout)
+    try:
+        with db:
+            for statement in setup:
+                db.execute(statement)
+            return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
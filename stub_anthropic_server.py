@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Local stand-in for the Anthropic Messages API ---
+# Lets the server and pipeline run without network access or an API key:
+#   python stub_anthropic_server.py --port 8765
+#   ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=stub python main.py
+# Replies are deterministic and prompt caching is simulated so cache-control markers
+# and the usage fields they produce can be checked end to end. Message Batches are
+# supported too: a batch reports in_progress on its first poll and ended afterwards.
+
+CHARS_PER_TOKEN = 4
+MIN_CACHEABLE_TOKENS = 1024
+
+_state_lock = threading.Lock()
+_cached_prefixes = set()
+_batches = {}  # batch id -> {"batch": MessageBatch JSON, "results": [result lines], "polls": int}
+
+def _tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _blocks(content):
+    """Normalizes a string or list-of-blocks content field into text blocks."""
+    if isinstance(content, str): return [{"type": "text", "text": content}]
+    return [block for block in content if block.get("type") == "text"]
+
+def simulate_usage(params):
+    """Computes usage the way provider-side prompt caching would: per cache_control breakpoint."""
+    blocks = _blocks(params.get("system") or [])
+    for message in params.get("messages", []):
+        blocks.extend(_blocks(message["content"]))
+
+    prefix, total, read, write = hashlib.sha256(), 0, 0, 0
+    for block in blocks:
+        prefix.update(block["text"].encode("utf-8"))
+        total += _tokens(block["text"])
+        if "cache_control" not in block or total < MIN_CACHEABLE_TOKENS: continue
+        key = prefix.hexdigest()
+        with _state_lock:
+            if key in _cached_prefixes:
+                read, write = total, 0
+            else:
+                _cached_prefixes.add(key)
+                write = total - read
+    return {"input_tokens": total - read - write, "cache_read_input_tokens": read,
+            "cache_creation_input_tokens": write, "output_tokens": 0}
+
+def build_message(params):
+    """Builds a deterministic Messages API response for the given request parameters."""
+    last_user = params["messages"][-1]
+    question = _blocks(last_user["content"])[-1]["text"]
+    text = f"Stub reply ({params.get('model')}): {question[-200:]}"
+    usage = simulate_usage(params)
+    usage["output_tokens"] = _tokens(text)
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant", "model": params.get("model"),
+        "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None, "usage": usage,
+    }
+
+def _timestamp(offset=timedelta(0)):
+    return (datetime.now(timezone.utc) + offset).isoformat().replace("+00:00", "Z")
+
+def create_batch(params, base_url):
+    """Answers every request up front; the batch reports in_progress once before it has ended."""
+    batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+    results = [{"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": build_message(request["params"])}}
+               for request in params.get("requests", [])]
+    batch = {
+        "id": batch_id, "type": "message_batch", "processing_status": "in_progress",
+        "request_counts": {"processing": len(results), "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0},
+        "created_at": _timestamp(), "expires_at": _timestamp(timedelta(days=1)), "ended_at": None,
+        "cancel_initiated_at": None, "archived_at": None, "results_url": None,
+    }
+    with _state_lock:
+        _batches[batch_id] = {"batch": batch, "results": results, "polls": 0, "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results"}
+    return batch
+
+def retrieve_batch(batch_id):
+    with _state_lock:
+        entry = _batches.get(batch_id)
+        if entry is None: return None
+        entry["polls"] += 1
+        batch = entry["batch"]
+        if entry["polls"] > 1 and batch["processing_status"] != "ended":
+            batch.update({"processing_status": "ended", "ended_at": _timestamp(), "results_url": entry["results_url"],
+                          "request_counts": {**batch["request_counts"], "processing": 0, "succeeded": len(entry["results"])}})
+        return batch
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, message):
+        """Replays a finished message as the Messages API streaming event sequence."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        text = message["content"][0]["text"]
+        start = {**message, "content": [], "stop_reason": None, "usage": {**message["usage"], "output_tokens": 1}}
+        events = [("message_start", {"type": "message_start", "message": start}),
+                  ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})]
+        for i in range(0, len(text), 16):
+            events.append(("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                   "delta": {"type": "text_delta", "text": text[i:i + 16]}}))
+        events += [("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                   ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": message["usage"]["output_tokens"]}}),
+                   ("message_stop", {"type": "message_stop"})]
+        for name, data in events:
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4:
+            batch = retrieve_batch(parts[3])
+            if batch is None:
+                self._send_json({"type": "error", "error": {"type": "not_found_error", "message": parts[3]}}, status=404)
+            elif len(parts) == 5 and parts[4] == "results":
+                body = "".join(json.dumps(line) + "\n" for line in _batches[parts[3]]["results"]).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/binary")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(batch)
+            return
+        self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, status=404)
+
+    def do_POST(self):
+        if self.path.split("?")[0] == "/v1/messages/batches":
+            host, port = self.server.server_address[:2]
+            self._send_json(create_batch(self._read_json(), f"http://{host}:{port}"))
+            return
+        if self.path.split("?")[0] == "/v1/messages":
+            params = self._read_json()
+            message = build_message(params)
+            if params.get("stream"):
+                self._send_stream(message)
+            else:
+                self._send_json(message)
+            return
+        self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, status=404)
+
+    def log_message(self, format, *args):
+        print(f"  - [stub] {format % args}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic Messages API.")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub Anthropic API listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
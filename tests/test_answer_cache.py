@@ -0,0 +1,60 @@
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, normalize_question
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+def test_normalized_questions_share_an_entry():
+    assert normalize_question("  What causes a WATCHDOG reset?? ") == "what causes a watchdog reset"
+    cache = AnswerCache()
+    cache.set_version("v1")
+    cache.put("What causes a watchdog reset?", "reply")
+    assert cache.get("what causes a  watchdog reset") == "reply"
+    assert cache.stats()["hits"] == 1
+
+def test_least_recently_used_entry_is_dropped():
+    cache = AnswerCache(max_entries=2)
+    cache.set_version("v1")
+    cache.put("first", "1")
+    cache.put("second", "2")
+    cache.get("first")
+    cache.put("third", "3")
+    assert cache.get("second") is None
+    assert (cache.get("first"), cache.get("third")) == ("1", "3")
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    cache.set_version("v1")
+    cache.put("question", "reply")
+    clock[0] += 59
+    assert cache.get("question") == "reply"
+    clock[0] += 2
+    assert cache.get("question") is None
+
+def test_new_cvot_version_invalidates_answers():
+    cache = AnswerCache()
+    cache.set_version("v1")
+    cache.put("question", "old reply")
+    cache.set_version("v2")
+    assert cache.get("question") is None
+    cache.put("question", "stale reply", version="v1")  # Computed before the reload finished
+    assert cache.get("question") is None
+
+def test_answers_survive_a_restart(tmp_path):
+    db_path = str(tmp_path / "answers.sqlite3")
+    cache = AnswerCache(db_path=db_path)
+    cache.set_version("v1")
+    cache.put("question", "reply")
+
+    restarted = AnswerCache(db_path=db_path)
+    restarted.set_version("v1")
+    assert restarted.get("question") == "reply"
+    restarted.set_version("v2")  # Deletes every stored answer for v1
+    again = AnswerCache(db_path=db_path)
+    again.set_version("v1")
+    assert again.get("question") is None
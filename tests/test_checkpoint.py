@@ -0,0 +1,34 @@
+from checkpoint import (append_record, index_records, iter_latest_records, load_source_text_lookup, make_record,
+                        repair_checkpoint, source_key)
+
+def record(tmp_path, doc, title, text="source text", **fields):
+    return make_record(title, text, {}, {}, blob_dir=str(tmp_path / "blobs"), doc=doc, **fields)
+
+def test_resume_after_a_crash_mid_append(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    append_record(path, record(tmp_path, "a.pdf", "Clocks", section_hash="h1"))
+    with open(path, "a") as f:
+        f.write('{"doc": "a.pdf", "title": "Res')  # Interrupted write
+    repair_checkpoint(path)
+    append_record(path, record(tmp_path, "a.pdf", "Resets", section_hash="h2"))
+    assert index_records(path).keys() == {("a.pdf", "Clocks"), ("a.pdf", "Resets")}
+    assert index_records(path)[("a.pdf", "Resets")][1] == "h2"
+
+def test_latest_record_wins_and_follows_the_plan_order(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    for doc, title, section_hash in [("a.pdf", "Clocks", "old"), ("b.pdf", "Clocks", "b"), ("a.pdf", "Clocks", "new"),
+                                     ("a.pdf", "Retired", "x")]:
+        append_record(path, record(tmp_path, doc, title, section_hash=section_hash))
+    order = [("b.pdf", "Clocks"), ("a.pdf", "Clocks")]
+    assert [(r["doc"], r["section_hash"]) for r in iter_latest_records(path, order=order)] == [("b.pdf", "b"), ("a.pdf", "new")]
+
+def test_source_text_is_keyed_by_document_and_title(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    append_record(path, record(tmp_path, "a.pdf", "Clocks", "clock text from a"))
+    append_record(path, record(tmp_path, "b.pdf", "Clocks", "clock text from b"))
+    append_record(path, record(tmp_path, "b.pdf", "Resets", "reset text"))
+    lookup = load_source_text_lookup(path, blob_dir=str(tmp_path / "blobs"))
+    assert lookup.get(source_key("a.pdf", "Clocks")) == "clock text from a"
+    assert lookup.get(source_key("b.pdf", "Clocks")) == "clock text from b"
+    assert lookup.get("Resets") == "reset text"  # Unique titles also resolve on their own
+    assert lookup.get("Clocks") is None
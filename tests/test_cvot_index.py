@@ -0,0 +1,24 @@
+from cvot_index import build_graph_index, search_nodes
+
+CVOT = {
+    "nodes": {
+        "error_conditions": [
+            {"id": "E1", "type": "error_conditions", "description": "Watchdog reset", "source_title": "Resets"},
+            {"id": "E2", "type": "error_conditions", "description": "NMI watchdog reset", "source_title": "Resets"},
+            {"id": "E3", "type": "error_conditions", "description": "Flash ECC error", "source_title": "Flash"},
+        ],
+        "components": [{"id": "C1", "type": "components", "description": "Watchdog timer", "source_title": "Resets"}],
+    },
+    "causal_vectors": {},
+}
+
+def test_exact_match_ranks_first_and_is_highlighted():
+    results = search_nodes(build_graph_index(CVOT), "watchdog reset")
+    assert [result["id"] for result in results][:2] == ["E1", "E2"]
+    assert results[0]["highlight"] == "<mark>Watchdog</mark> <mark>reset</mark>"
+    assert "E3" not in {result["id"] for result in results}
+
+def test_type_filter_and_unknown_terms():
+    index = build_graph_index(CVOT)
+    assert [result["id"] for result in search_nodes(index, "watchdog", node_types=["components"])] == ["C1"]
+    assert search_nodes(index, "nonexistent") == []
@@ -0,0 +1,36 @@
+import pytest
+
+from entity_resolution import describe, find_clusters, is_variant
+
+SAME_ENTITY = [
+    ("Watchdog reset", "Watchdog timer reset"),
+    ("Register flag ERRSTS", "Regster flag ERRSTS"),
+    ("DCDCSTS.INDDETECT", "DCDCSTS.INDDETCT"),
+    ("Brown-out reset", "Brownout reset"),
+    ("Single bit ECC error", "Single-bit ECC errors"),
+]
+
+DIFFERENT_ENTITIES = [
+    ("Single-bit ECC errors", "Single-bit ECC address error"),
+    ("Double-bit data error", "double error"),
+    ("interrupt enable register", "enable registers"),
+    ("NMI watchdog reset", "Watchdog reset"),
+    ("Correctable error", "Uncorrectable error"),
+    ("Interrupt cleared", "Interrupt not cleared"),
+    ("Flash write error", "Flash read error"),
+    ("XRSn reset", "WDRSn reset"),
+    ("UNC_ERR_L = 1", "UNC_ERR_H = 1"),
+    ("PIEIFR bits", "PIEIER bit"),
+    ("Timer0 overflow", "Timer1 overflow"),
+]
+
+@pytest.mark.parametrize("a, b", SAME_ENTITY)
+def test_variants_merge(a, b):
+    assert is_variant(describe(a), describe(b))
+    assert is_variant(describe(b), describe(a))
+    assert find_clusters([a, b]) == [0, 0]
+
+@pytest.mark.parametrize("a, b", DIFFERENT_ENTITIES)
+def test_distinct_entities_stay_apart(a, b):
+    assert not is_variant(describe(a), describe(b))
+    assert not is_variant(describe(b), describe(a))
@@ -0,0 +1,45 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import anthropic
+import pytest
+
+import stub_anthropic_server
+from llm_batch import batch_request, run_batch
+from llm_cache import LLMResponseCache
+
+@pytest.fixture(scope="module")
+def stub_client():
+    """An Anthropic client talking to stub_anthropic_server on a free local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_anthropic_server.StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield anthropic.Anthropic(api_key="stub", base_url=f"http://127.0.0.1:{server.server_address[1]}", max_retries=0)
+    server.shutdown()
+    server.server_close()
+
+def requests(*questions):
+    return [batch_request(f"req-{i}", "stub-model", "system", question) for i, question in enumerate(questions)]
+
+def test_run_batch_polls_until_ended_and_maps_results(stub_client, tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    results = run_batch(stub_client, requests("first question", "second question"), poll_interval=0, cache=cache)
+    assert results == {"req-0": "Stub reply (stub-model): first question",
+                       "req-1": "Stub reply (stub-model): second question"}
+    assert cache.writes == 2
+
+def test_cached_requests_are_not_submitted(stub_client, tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    run_batch(stub_client, requests("first question"), poll_interval=0, cache=cache)
+    submitted = len(stub_anthropic_server._batches)
+    results = run_batch(stub_client, requests("first question", "new question"), poll_interval=0, cache=cache)
+    assert len(stub_anthropic_server._batches) == submitted + 1
+    assert results["req-0"] == "Stub reply (stub-model): first question"
+    assert cache.hits == 1
+
+def test_fully_cached_batch_makes_no_api_calls(stub_client, tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    run_batch(stub_client, requests("first question"), poll_interval=0, cache=cache)
+    submitted = len(stub_anthropic_server._batches)
+    assert run_batch(stub_client, requests("first question"), poll_interval=0, cache=cache) == {
+        "req-0": "Stub reply (stub-model): first question"}
+    assert len(stub_anthropic_server._batches) == submitted
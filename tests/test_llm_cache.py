@@ -0,0 +1,83 @@
+import itertools
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import llm_cache
+from llm_cache import LLMResponseCache
+
+@pytest.fixture(autouse=True)
+def ticking_clock(monkeypatch):
+    """Every call to time.time() is one second later, so least-recently-used order is unambiguous."""
+    clock = itertools.count(1)
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: float(next(clock))))
+
+def request(n):
+    return {"model": "test-model", "max_tokens": 10, "temperature": 0.1, "system": "s",
+            "messages": [{"role": "user", "content": f"question {n}"}]}
+
+def test_round_trip_and_modes(tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    assert cache.get(request(1)) is None
+    cache.put(request(1), "answer")
+    assert cache.get(request(1)) == "answer"
+    assert (cache.hits, cache.misses, cache.writes) == (1, 1, 1)
+
+    refresh = LLMResponseCache(tmp_path / "cache.sqlite3", mode="refresh")
+    assert refresh.get(request(1)) is None
+    off = LLMResponseCache(tmp_path / "off.sqlite3", mode="off")
+    off.put(request(1), "answer")
+    assert LLMResponseCache(tmp_path / "off.sqlite3").get(request(1)) is None
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3", max_bytes=30)
+    for n in range(3):
+        cache.put(request(n), "x" * 10)
+    cache.get(request(0))  # Now more recently used than request 1
+    cache.put(request(3), "x" * 10)
+    assert cache.evictions == 1
+    assert cache.get(request(1)) is None
+    assert all(cache.get(request(n)) == "x" * 10 for n in (0, 2, 3))
+
+def test_large_eviction_stays_under_sqlite_variable_limit(tmp_path, monkeypatch):
+    connect = sqlite3.connect
+
+    def connect_with_old_limit(*args, **kwargs):
+        db = connect(*args, **kwargs)
+        db.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)  # The default before SQLite 3.32
+        return db
+
+    monkeypatch.setattr(sqlite3, "connect", connect_with_old_limit)
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3", max_bytes=10 ** 9)
+    for n in range(1200):
+        cache.put(request(n), "x" * 10)
+    cache.max_bytes = 10
+    cache.put(request("last"), "x" * 10)
+    assert cache.evictions == 1200
+    assert cache.get(request("last")) == "x" * 10
+    assert cache.stats()["entries"] == 1
+
+class FakeClient:
+    """Answers messages.create with a fixed reply and counts the calls."""
+
+    def __init__(self, text, stop_reason="end_turn"):
+        self.calls = 0
+        self.messages = SimpleNamespace(create=self.create)
+        self.reply = SimpleNamespace(content=[SimpleNamespace(text=text)], stop_reason=stop_reason)
+
+    def create(self, **params):
+        self.calls += 1
+        return self.reply
+
+def test_cached_create_answers_repeats_from_the_cache(tmp_path):
+    cache, client = LLMResponseCache(tmp_path / "cache.sqlite3"), FakeClient("answer")
+    assert llm_cache.cached_create(client, request(1), cache) == "answer"
+    assert llm_cache.cached_create(client, request(1), cache) == "answer"
+    assert client.calls == 1
+
+def test_cached_create_never_stores_truncated_replies(tmp_path):
+    cache, client = LLMResponseCache(tmp_path / "cache.sqlite3"), FakeClient("cut o", stop_reason="max_tokens")
+    llm_cache.cached_create(client, request(1), cache)
+    llm_cache.cached_create(client, request(1), cache)
+    assert client.calls == 2 and cache.writes == 0
@@ -0,0 +1,63 @@
+import importlib
+import os
+import shutil
+
+import pytest
+
+import stub_anthropic_server
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="module")
+def main():
+    """Imports the Flask app without the file watcher or a real API key."""
+    os.environ.setdefault("CVOT_WATCH_INTERVAL", "0")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    return importlib.import_module("main")
+
+@pytest.fixture
+def served(main, monkeypatch, tmp_path):
+    """Points the app at a private copy of the shipped weighted CVOT."""
+    path = tmp_path / "cvot.json"
+    shutil.copy(os.path.join(REPO_DIR, "ti_mcu_cvot_weighted.json"), path)
+    monkeypatch.setattr(main, "CVOT_DATA_FILE", str(path))
+    monkeypatch.setattr(main, "snapshot", main.load_snapshot(str(path)))
+    return path
+
+def test_full_context_prefix_is_cached_across_questions(main, served, monkeypatch):
+    monkeypatch.setattr(main, "CHAT_CONTEXT_MODE", "full")
+    first, _ = main.build_chat_request("What causes a watchdog reset?")
+    second, _ = main.build_chat_request("How do I clear a flash ECC error?")
+    assert "cache_control" in first["messages"][0]["content"][0]
+    assert stub_anthropic_server.simulate_usage(first)["cache_creation_input_tokens"] >= main.MIN_CACHEABLE_TOKENS
+    assert stub_anthropic_server.simulate_usage(second)["cache_read_input_tokens"] >= main.MIN_CACHEABLE_TOKENS
+
+def test_scoped_context_sends_no_uncacheable_markers(main, served, monkeypatch):
+    monkeypatch.setattr(main, "CHAT_CONTEXT_MODE", "scoped")
+    kwargs, _ = main.build_chat_request("What causes a watchdog reset?")
+    blocks = kwargs["system"] + kwargs["messages"][0]["content"]
+    assert not any("cache_control" in block for block in blocks)
+
+def test_reload_swaps_in_a_changed_file(main, served):
+    before = main.snapshot.payload["etag"]
+    data = main.snapshot.data
+    data["nodes"]["error_conditions"] = data["nodes"]["error_conditions"][:-1]
+    served.write_text(main.json.dumps(data))
+    assert main.reload_cvot("test") == (True, "reloaded")
+    assert main.snapshot.payload["etag"] != before
+    assert main.answer_cache.version == main.snapshot.payload["etag"]
+
+def test_failed_reload_keeps_serving_the_current_snapshot(main, served):
+    current = main.snapshot
+    served.write_text('{"nodes": {"error_conditions": [{"description": "no id"}]}, "causal_vectors": {}}')
+    reloaded, message = main.reload_cvot("test")
+    assert not reloaded and message
+    assert main.snapshot is current
+
+def test_cvot_endpoint_revalidates_with_etag(main, served):
+    client = main.app.test_client()
+    response = client.get("/api/cvot", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and response.headers["Content-Encoding"] == "gzip"
+    assert main.json.loads(main.gzip.decompress(response.data)) == main.snapshot.data
+    etag = response.headers["ETag"]
+    assert client.get("/api/cvot", headers={"If-None-Match": etag}).status_code == 304
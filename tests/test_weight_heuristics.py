@@ -0,0 +1,34 @@
+from weight_heuristics import triage_relationships
+
+TEXT = ("The device supports several configuration options. A set NMIFLG.CLOCKFAIL bit indicates a missing clock "
+        "condition. Refer to the datasheet for timing values. The RESC.WDRSN bit is latched. This register is "
+        "reserved. See the watchdog reset description. Writes to this field have no effect.")
+
+NODES = {
+    "N1": {"description": "NMIFLG.CLOCKFAIL bit", "source_title": "Clocks"},
+    "N2": {"description": "Missing clock condition", "source_title": "Clocks"},
+    "N3": {"description": "RESC.WDRSN bit", "source_title": "Clocks"},
+    "N4": {"description": "Watchdog reset", "source_title": "Clocks"},
+    "N5": {"description": "Flash ECC error", "source_title": "Clocks"},
+    "N6": {"description": "Stack overflow", "source_title": "Clocks"},
+}
+
+def relationship(from_id, to_id):
+    return {"from_id": from_id, "to_id": to_id, "from_desc": NODES[from_id]["description"], "to_desc": NODES[to_id]["description"]}
+
+def test_only_explicit_edges_settle():
+    explicit, nearby, absent = relationship("N1", "N2"), relationship("N3", "N4"), relationship("N5", "N6")
+    settled, uncertain = triage_relationships([explicit, nearby, absent], NODES, {"Clocks": TEXT})
+    assert [(update["from_id"], update["to_id"]) for update in settled] == [("N1", "N2")]
+    assert uncertain == [nearby, absent]
+    assert settled[0]["confidence"] >= 0.7 and settled[0]["weight"] >= 0.8
+
+def test_weight_and_confidence_are_separate_signals():
+    nearby = relationship("N3", "N4")
+    settled, _ = triage_relationships([nearby], NODES, {"Clocks": TEXT}, band=(1.0, 1.0))
+    # Mentioned two sentences apart: a moderate weight, but not explicit enough to be confident
+    assert settled[0]["weight"] > settled[0]["confidence"]
+
+def test_missing_source_text_goes_to_the_llm():
+    settled, uncertain = triage_relationships([relationship("N1", "N2")], NODES, {})
+    assert settled == [] and len(uncertain) == 1
@@ -1,53 +1,51 @@
 import os
 import json
-import anthropic
+import argparse
 from dotenv import load_dotenv
 from datetime import datetime
 import re
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from checkpoint import append_records, iter_records, load_source_text_lookup, repair_checkpoint, source_key
+from llm_batch import batch_request, run_batch
+from cvot_index import estimate_tokens
+from llm_cache import cached_create, response_cache
+from storage import atomic_write
+from weight_heuristics import triage_relationships
+from llm_client import create_client
 
 load_dotenv()
 
 # --- Configuration ---
 CVOT_INPUT_JSON = "ti_mcu_cvot.json"
-INTERMEDIATE_INPUT_JSON = "intermediate_data.json" # ⭐ NEW: Input for contextual text
+INTERMEDIATE_INPUT = "intermediate_data.jsonl" # ⭐ NEW: Input for contextual text (JSONL checkpoint + blob store)
+LEGACY_INTERMEDIATE_INPUT_JSON = "intermediate_data.json" # Used when no JSONL checkpoint exists yet
 OUTPUT_JSON = "ti_mcu_cvot_weighted.json"
+WEIGHT_PROGRESS_FILE = "weight_progress.jsonl"  # Weights from finished batches, so a crashed run resumes where it stopped
 ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+WEIGHT_BATCH_TOKEN_BUDGET = int(os.getenv("WEIGHT_BATCH_TOKENS", "12000"))  # Estimated user-prompt tokens per batch
+WEIGHT_MAX_BATCH_SIZE = 40  # Caps relationships per batch so the JSON reply fits in WEIGHT_MAX_TOKENS
+WEIGHT_MAX_TOKENS = 4000
+WEIGHT_WORKERS = int(os.getenv("WEIGHT_WORKERS", "4"))  # Batches in flight; llm_client still caps total requests
+CONTEXT_CHARS = 2000  # Documentation excerpt per source section, included once per batch
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+client = create_client()
 
 # --- LLM Handling ---
 
 def call_llm(system_prompt, user_prompt, max_tokens=4000):
-    """Generic LLM call function."""
+    """Generic LLM call function, with rate-limit-aware retries and the shared on-disk response cache."""
+    params = {
+        "model": ANTHROPIC_MODEL, "max_tokens": max_tokens, "temperature": 0.1,
+        "system": system_prompt, "messages": [{"role": "user", "content": user_prompt}],
+    }
     try:
-        response = client.messages.create(
-            model=ANTHROPIC_MODEL, max_tokens=max_tokens, temperature=0.1,
-            system=system_prompt, messages=[{"role": "user", "content": user_prompt}]
-        )
-        return response.content[0].text
+        return cached_create(client, params)
     except Exception as e:
         print(f"    - ERROR calling LLM: {e}")
         return None
 
-def analyze_weights_with_llm(relationships, node_lookup, source_text_lookup):
-    """⭐ REVISED: Use LLM to analyze relationships with targeted context."""
-    updated_relationships = []
-    batch_size = 20  # Reduced batch size for more focused prompts
-    
-    for i in range(0, len(relationships), batch_size):
-        batch = relationships[i:i+batch_size]
-        print(f"\n  Analyzing batch {i//batch_size + 1} ({len(batch)} relationships)...")
-
-        # For each relationship in the batch, find its specific context
-        prompt_context = ""
-        for rel in batch:
-            from_node = node_lookup.get(rel['from_id'])
-            if from_node:
-                source_title = from_node.get("source_title")
-                context = source_text_lookup.get(source_title, "")
-                prompt_context += f"--- Context for '{from_node['description']}' ---\n{context[:2000]}\n\n"
-
-        system_prompt = """You are an expert in embedded systems architecture and microcontroller troubleshooting. Your task is to analyze technical documentation and assign intelligent weights and confidence levels to causal relationships.
+WEIGHT_SYSTEM_PROMPT = """You are an expert in embedded systems architecture and microcontroller troubleshooting. Your task is to analyze technical documentation and assign intelligent weights and confidence levels to causal relationships.
 
 WEIGHT GUIDELINES (0.1-1.0) - Likelihood / Severity / Effectiveness:
 - Critical Hardware Faults: 0.9-1.0 (e.g., Memory access violation, illegal instruction, watchdog reset)
@@ -65,35 +63,208 @@ CONFIDENCE GUIDELINES (0.1-1.0) - Certainty of the Relationship:
 
 Respond with ONLY a JSON array of objects, where each object has: "from_id", "to_id", "weight", and "confidence"."""
 
-        user_prompt = f"""Based on the provided technical documentation context, analyze the following causal relationships for a C2000 microcontroller.
+def source_context(rel, node_lookup, source_text_lookup):
+    """(source key, documentation excerpt) for a relationship, taken from its from node's document and section."""
+    from_node = node_lookup.get(rel['from_id'])
+    if not from_node or not from_node.get("source_title"): return None, ""
+    key = source_key(from_node.get("source_doc"), from_node["source_title"])
+    return key, (source_text_lookup.get(key, "") or "")[:CONTEXT_CHARS]
 
-RELATIONSHIPS TO ANALYZE:
-{json.dumps([{"from_id": r["from_id"], "to_id": r["to_id"], "from_desc": r["from_desc"], "to_desc": r["to_desc"]} for r in batch], indent=2)}
+def relationship_payload(rel, context_id=None):
+    payload = {"from_id": rel["from_id"], "to_id": rel["to_id"], "from_desc": rel["from_desc"], "to_desc": rel["to_desc"]}
+    if context_id: payload["context_id"] = context_id
+    return payload
+
+def batch_contexts(batch, node_lookup, source_text_lookup):
+    """The distinct source sections of a batch in first-seen order: {source key: excerpt}."""
+    contexts = {}
+    for rel in batch:
+        title, excerpt = source_context(rel, node_lookup, source_text_lookup)
+        if title is not None and excerpt and title not in contexts:
+            contexts[title] = excerpt
+    return contexts
+
+def build_weight_prompt(batch, node_lookup, source_text_lookup):
+    """
+    Builds the user prompt for one batch: every distinct documentation excerpt once (C1, C2, ...),
+    then the relationships, each referencing its excerpt by context_id.
+    """
+    contexts = batch_contexts(batch, node_lookup, source_text_lookup)
+    context_ids = {title: f"C{i + 1}" for i, title in enumerate(contexts)}
+    prompt_context = "".join(f"--- [{context_ids[title]}] {title} ---\n{excerpt}\n\n" for title, excerpt in contexts.items())
+    relationships = [relationship_payload(rel, context_ids.get(source_context(rel, node_lookup, source_text_lookup)[0])) for rel in batch]
+
+    return f"""RELEVANT TECHNICAL DOCUMENTATION CONTEXT:
+{prompt_context}Based on the provided technical documentation context, analyze the following causal relationships for a C2000 microcontroller. Each relationship's context_id names the documentation excerpt above that it comes from.
 
----
-RELEVANT TECHNICAL DOCUMENTATION CONTEXT:
-{prompt_context}
----
+RELATIONSHIPS TO ANALYZE:
+{json.dumps(relationships, indent=2)}
 
 Assign a `weight` (likelihood/severity/effectiveness) and `confidence` (certainty) to each relationship. Return ONLY the JSON array."""
 
-        response_text = call_llm(system_prompt, user_prompt, max_tokens=4000)
-        
-        if response_text:
-            try:
-                json_match = re.search(r'\[\s*\{.*?\}\s*\]', response_text, re.DOTALL)
-                if json_match:
-                    updates = json.loads(json_match.group(0))
-                    updated_relationships.extend(updates)
-                    print(f"    - Successfully updated weights for {len(updates)} relationships.")
-                else:
-                    print("    - WARNING: No valid JSON array found in LLM response.")
-            except json.JSONDecodeError as e:
-                print(f"    - ERROR: Failed to decode JSON from LLM response: {e}")
+def report_prompt_tokens(batches, node_lookup, source_text_lookup):
+    """Prints estimated input tokens against pasting each relationship's excerpt separately."""
+    per_relationship = sum(estimate_tokens(json.dumps(relationship_payload(rel), indent=2)
+                                           + f"--- Context for '{rel['from_desc']}' ---\n{source_context(rel, node_lookup, source_text_lookup)[1]}\n\n")
+                           for batch in batches for rel in batch)
+    deduplicated = sum(estimate_tokens(build_weight_prompt(batch, node_lookup, source_text_lookup)) for batch in batches)
+    print(f"  - Weighting prompts: ~{deduplicated} user-prompt tokens across {len(batches)} batches "
+          f"(~{per_relationship} with per-relationship context, {1 - deduplicated / max(per_relationship, 1):.0%} less).")
+
+def parse_weight_response(response_text):
+    """Extracts the list of weight updates from an LLM response, or [] if none could be parsed."""
+    if not response_text: return []
+    try:
+        json_match = re.search(r'\[\s*\{.*?\}\s*\]', response_text, re.DOTALL)
+        if json_match:
+            updates = json.loads(json_match.group(0))
+            print(f"    - Successfully updated weights for {len(updates)} relationships.")
+            return updates
+        print("    - WARNING: No valid JSON array found in LLM response.")
+    except json.JSONDecodeError as e:
+        print(f"    - ERROR: Failed to decode JSON from LLM response: {e}")
+    return []
+
+def pack_batches(relationships, node_lookup, source_text_lookup, token_budget=WEIGHT_BATCH_TOKEN_BUDGET, max_size=WEIGHT_MAX_BATCH_SIZE):
+    """
+    Groups relationships by source section and packs them into batches by estimated prompt tokens,
+    counting each section's excerpt once per batch. Small sections share a batch; a section that
+    doesn't fit in the current batch starts a new one rather than paying for its excerpt in two.
+    """
+    groups = {}
+    for rel in relationships:
+        groups.setdefault(source_context(rel, node_lookup, source_text_lookup)[0], []).append(rel)
+
+    batches, current, current_tokens, current_titles = [], [], 0, set()
+    for title, group in groups.items():
+        excerpt = source_context(group[0], node_lookup, source_text_lookup)[1]
+        context_tokens = estimate_tokens(f"--- [C1] {title} ---\n{excerpt}\n\n") if excerpt else 0
+        group_tokens = [estimate_tokens(json.dumps(relationship_payload(rel, "C1"), indent=2)) for rel in group]
+        if current and (current_tokens + context_tokens + sum(group_tokens) > token_budget or len(current) + len(group) > max_size):
+            batches.append(current)
+            current, current_tokens, current_titles = [], 0, set()
+        for rel, rel_tokens in zip(group, group_tokens):
+            cost = rel_tokens + (0 if title in current_titles else context_tokens)
+            if current and (current_tokens + cost > token_budget or len(current) >= max_size):
+                batches.append(current)
+                current, current_tokens, current_titles = [], 0, set()
+                cost = rel_tokens + context_tokens
+            current.append(rel)
+            current_tokens += cost
+            current_titles.add(title)
+    if current: batches.append(current)
+    return batches
+
+def missing_relationships(batch, updates):
+    """Relationships of a batch that have no usable weight in the parsed updates."""
+    answered = {(up.get("from_id"), up.get("to_id")) for up in updates if isinstance(up, dict) and "weight" in up}
+    return [rel for rel in batch if (rel["from_id"], rel["to_id"]) not in answered]
+
+def split_for_retry(batch, updates, label):
+    """
+    Returns the sub-batches to retry for a batch whose reply was unparseable, truncated or skipped
+    some relationships: the unanswered ones, halved. A single unanswered relationship is given up on.
+    Only for replies that arrived; a failed call would fail the same way for every half.
+    """
+    missing = missing_relationships(batch, updates)
+    if not missing: return []
+    if len(missing) == 1 and len(batch) == 1:
+        print(f"    - WARNING: [{label}] No weight for {missing[0]['from_id']}->{missing[0]['to_id']}; keeping its current weight.")
+        return []
+    print(f"    - [{label}] {len(missing)}/{len(batch)} relationships unanswered; splitting and retrying.")
+    if len(missing) == 1: return [missing]
+    middle = len(missing) // 2
+    return [missing[:middle], missing[middle:]]
+
+def analyze_weights_with_llm(relationships, node_lookup, source_text_lookup, on_updates=None):
+    """
+    Weights relationships in token-packed batches dispatched through a bounded worker pool.
+    Truncated, unparseable or partial replies are split and retried instead of being dropped; a call
+    that failed outright (after llm_client's retries) leaves its relationships for the next run.
+    on_updates(updates) is called as each batch finishes.
+    """
+    batches = pack_batches(relationships, node_lookup, source_text_lookup)
+    print(f"\n  Packed {len(relationships)} relationships into {len(batches)} batches; running {WEIGHT_WORKERS} at a time...")
+    report_prompt_tokens(batches, node_lookup, source_text_lookup)
+
+    def analyze(batch):
+        """Returns the parsed updates, or None if the call itself failed."""
+        user_prompt = build_weight_prompt(batch, node_lookup, source_text_lookup)
+        response_text = call_llm(WEIGHT_SYSTEM_PROMPT, user_prompt, max_tokens=WEIGHT_MAX_TOKENS)
+        if response_text is None: return None
+        return parse_weight_response(response_text)
+
+    updated_relationships = []
+    with ThreadPoolExecutor(max_workers=WEIGHT_WORKERS) as executor:
+        pending = {executor.submit(analyze, batch): (f"batch {i + 1}", batch) for i, batch in enumerate(batches)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                label, batch = pending.pop(future)
+                try:
+                    updates = future.result()
+                except Exception as e:
+                    print(f"    - ERROR: [{label}] {e}")
+                    updates = None
+                if updates is None:
+                    print(f"    - ERROR: [{label}] LLM call failed; {len(batch)} relationships keep their current weight until the next run.")
+                    continue
+                updated_relationships.extend(updates)
+                if on_updates and updates: on_updates(updates)
+                for i, retry in enumerate(split_for_retry(batch, updates, label)):
+                    pending[executor.submit(analyze, retry)] = (f"{label}.{i + 1}", retry)
     return updated_relationships
 
+def analyze_weights_in_batch(relationships, node_lookup, source_text_lookup, on_updates=None):
+    """
+    Offline bulk mode: submits every token-packed weighting prompt as one Message Batches job.
+    Truncated, unparseable or partial replies are split and resubmitted in follow-up jobs; errored or
+    expired requests leave their relationships for the next run.
+    """
+    packed = pack_batches(relationships, node_lookup, source_text_lookup)
+    report_prompt_tokens(packed, node_lookup, source_text_lookup)
+    batches = {f"weights-{i:05d}": batch for i, batch in enumerate(packed)}
+    updated_relationships, round_number = [], 1
+    while batches:
+        requests = [batch_request(custom_id, ANTHROPIC_MODEL, WEIGHT_SYSTEM_PROMPT, build_weight_prompt(batch, node_lookup, source_text_lookup), max_tokens=WEIGHT_MAX_TOKENS)
+                    for custom_id, batch in batches.items()]
+        print(f"\n  Submitting {len(requests)} weighting prompts as a batch (round {round_number})...")
+        results = run_batch(client, requests, label="weights")
+        retries = {}
+        for custom_id, batch in batches.items():
+            if results.get(custom_id) is None:
+                print(f"    - ERROR: [{custom_id}] Request failed; {len(batch)} relationships keep their current weight until the next run.")
+                continue
+            updates = parse_weight_response(results.get(custom_id))
+            updated_relationships.extend(updates)
+            if on_updates and updates: on_updates(updates)
+            for i, retry in enumerate(split_for_retry(batch, updates, custom_id)):
+                retries[f"{custom_id}-{i + 1}"] = retry
+        batches, round_number = retries, round_number + 1
+    return updated_relationships
+
+# --- Incremental Re-Weighting ---
+
+def vector_fingerprint(rel, node_lookup, source_text_lookup):
+    """Hash of a vector's endpoint descriptions and the documentation context its weight was based on."""
+    _, excerpt = source_context(rel, node_lookup, source_text_lookup)
+    return hashlib.sha256(json.dumps([rel["from_desc"], rel["to_desc"], hashlib.sha256(excerpt.encode("utf-8")).hexdigest()]).encode("utf-8")).hexdigest()
+
+def load_previous_weights(path):
+    """Maps fingerprint -> weight update from a previously weighted CVOT, for vectors that carry one."""
+    if not os.path.exists(path): return {}
+    with open(path, 'r') as f:
+        previous = json.load(f)
+    return {vector["fingerprint"]: {"weight": vector.get("weight"), "confidence": vector.get("confidence"), "analysis_type": vector.get("analysis_type")}
+            for vectors in previous.get("causal_vectors", {}).values() for vector in vectors if vector.get("fingerprint")}
+
+def load_progress(path):
+    """Maps fingerprint -> weight update recorded by an interrupted run."""
+    repair_checkpoint(path)
+    return {entry["fingerprint"]: entry for entry in iter_records(path) if entry.get("fingerprint")}
+
 def update_cvot_with_weights(cvot_data, weight_updates):
-    """Update the main CVOT data with the newly analyzed weights and confidence."""
+    """Update the main CVOT data with the newly analyzed (or carried-forward) weights and confidence."""
     update_lookup = {f"{up['from_id']}->{up['to_id']}": up for up in weight_updates}
     updates_applied = 0
     for vectors in cvot_data["causal_vectors"].values():
@@ -103,15 +274,19 @@ def update_cvot_with_weights(cvot_data, weight_updates):
                 update = update_lookup[key]
                 vector["weight"] = update.get("weight", vector.get("weight"))
                 vector["confidence"] = update.get("confidence", vector.get("confidence"))
-                vector["analysis_type"] = "llm_contextual_analysis"
+                vector["analysis_type"] = update.get("analysis_type") or "llm_contextual_analysis"
+                if update.get("fingerprint"): vector["fingerprint"] = update["fingerprint"]
                 updates_applied += 1
     
     cvot_data["cvot_metadata"]["last_weight_update"] = datetime.now().isoformat()
-    cvot_data["cvot_metadata"]["weight_analysis_method"] = "LLM analysis with targeted documentation context"
-    print(f"\nApplied {updates_applied} new weights and confidence scores to the CVOT.")
+    heuristic = sum(up.get("analysis_type") == "heuristic_text_analysis" for up in weight_updates)
+    cvot_data["cvot_metadata"]["weight_analysis_method"] = ("Text-evidence heuristics, with LLM analysis of uncertain vectors" if heuristic
+                                                           else "LLM analysis with targeted documentation context")
+    cvot_data["cvot_metadata"]["heuristic_weighted_vectors"] = heuristic
+    print(f"\nApplied {updates_applied} weights and confidence scores to the CVOT ({heuristic} settled by the heuristic pre-pass).")
     return cvot_data
 
-def main():
+def main(use_batch_api=False, full=False, heuristics=True):
     """Main execution function."""
     print("=== TI MCU - Intelligent Weight Refinement Tool ===")
     
@@ -119,41 +294,83 @@ def main():
         print(f"\nLoading base CVOT from: {CVOT_INPUT_JSON}")
         with open(CVOT_INPUT_JSON, 'r') as f: cvot_data = json.load(f)
         
-        print(f"Loading intermediate data for context from: {INTERMEDIATE_INPUT_JSON}")
-        with open(INTERMEDIATE_INPUT_JSON, 'r') as f: intermediate_data = json.load(f)
+        if not os.path.exists(INTERMEDIATE_INPUT) and not os.path.exists(LEGACY_INTERMEDIATE_INPUT_JSON):
+            raise FileNotFoundError(2, "No such file", INTERMEDIATE_INPUT)
+        print(f"Loading intermediate data for context from: {INTERMEDIATE_INPUT}")
+        # Source text is read from the blob store lazily, only for sections a prompt references
+        source_text_lookup = load_source_text_lookup(INTERMEDIATE_INPUT, LEGACY_INTERMEDIATE_INPUT_JSON)
     except FileNotFoundError as e:
         print(f"ERROR: Input file not found: {e.filename}. Please run knowledge_extractor.py first.")
         return
 
     # Create lookup maps for nodes and source text
     node_lookup = {node["id"]: node for nodes in cvot_data["nodes"].values() for node in nodes}
-    source_text_lookup = {chunk['title']: chunk['source_text'] for chunk in intermediate_data if 'source_text' in chunk}
     
-    relationships_to_analyze = []
+    relationships = []
     for vectors in cvot_data["causal_vectors"].values():
         for vector in vectors:
-            relationships_to_analyze.append({
+            rel = {
                 "from_id": vector["from"], "to_id": vector["to"],
                 "from_desc": node_lookup.get(vector["from"], {}).get("description", "Unknown"),
                 "to_desc": node_lookup.get(vector["to"], {}).get("description", "Unknown")
-            })
+            }
+            rel["fingerprint"] = vector_fingerprint(rel, node_lookup, source_text_lookup)
+            relationships.append(rel)
 
-    print(f"\nFound {len(relationships_to_analyze)} relationships to analyze.")
-    print("\nStarting LLM analysis to assign intelligent weights with targeted context...")
-    weight_updates = analyze_weights_with_llm(relationships_to_analyze, node_lookup, source_text_lookup)
-    
-    if not weight_updates:
-        print("ERROR: No weight updates were generated. Exiting.")
-        return
+    # Vectors whose endpoints and context are unchanged keep their weights; an interrupted run's
+    # finished batches are picked up from the progress file
+    known = {} if full else {**load_previous_weights(OUTPUT_JSON), **load_progress(WEIGHT_PROGRESS_FILE)}
+    weight_updates, relationships_to_analyze = [], []
+    for rel in relationships:
+        if rel["fingerprint"] in known:
+            weight_updates.append({**known[rel["fingerprint"]], "from_id": rel["from_id"], "to_id": rel["to_id"], "fingerprint": rel["fingerprint"]})
+        else:
+            relationships_to_analyze.append(rel)
+
+    print(f"\nFound {len(relationships)} relationships: {len(weight_updates)} unchanged, {len(relationships_to_analyze)} new or changed.")
+    if relationships_to_analyze and heuristics:
+        # Edges stated plainly in the source text are weighted locally; only the uncertain ones cost an LLM call
+        settled, relationships_to_analyze = triage_relationships(relationships_to_analyze, node_lookup, source_text_lookup)
+        fingerprints = {(rel["from_id"], rel["to_id"]): rel["fingerprint"] for rel in relationships}
+        weight_updates.extend({**update, "fingerprint": fingerprints[(update["from_id"], update["to_id"])]} for update in settled)
+    if relationships_to_analyze:
+        fingerprints = {(rel["from_id"], rel["to_id"]): rel["fingerprint"] for rel in relationships_to_analyze}
+
+        def record_progress(updates):
+            entries = []
+            for update in updates:
+                fingerprint = fingerprints.get((update.get("from_id"), update.get("to_id")))
+                if fingerprint is None: continue
+                update["fingerprint"] = fingerprint
+                entries.append({"fingerprint": fingerprint, "weight": update.get("weight"), "confidence": update.get("confidence"),
+                                "analysis_type": "llm_contextual_analysis"})
+            if entries: append_records(WEIGHT_PROGRESS_FILE, entries)
+
+        print("\nStarting LLM analysis to assign intelligent weights with targeted context...")
+        analyze = analyze_weights_in_batch if use_batch_api else analyze_weights_with_llm
+        new_updates = analyze(relationships_to_analyze, node_lookup, source_text_lookup, on_updates=record_progress)
+        if not new_updates:
+            print("ERROR: No weight updates were generated. Exiting.")
+            return
+        weight_updates.extend(new_updates)
 
     print("\nUpdating the CVOT with new weights from the analysis...")
     weighted_cvot = update_cvot_with_weights(cvot_data, weight_updates)
     
-    with open(OUTPUT_JSON, 'w') as f:
+    # Write to a temp file and rename so a running server never sees a half-written CVOT
+    with atomic_write(OUTPUT_JSON) as f:
         json.dump(weighted_cvot, f, indent=2)
+    if os.path.exists(WEIGHT_PROGRESS_FILE):
+        os.remove(WEIGHT_PROGRESS_FILE)  # Everything it recorded is now in OUTPUT_JSON
         
     print(f"\n--- Weight Refinement Complete ---")
     print(f"The newly weighted CVOT has been saved to: {OUTPUT_JSON}")
+    response_cache.report()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Assign LLM-analyzed weights and confidence to CVOT causal vectors.")
+    parser.add_argument("--batch", action="store_true", help="Use the Message Batches API instead of live requests (slower, cheaper, higher throughput).")
+    parser.add_argument("--full", action="store_true", help="Re-weight every vector instead of only new or changed ones.")
+    parser.add_argument("--no-heuristics", action="store_true", help="Send every new or changed vector to the LLM, skipping the local text-evidence pre-pass.")
+    args = parser.parse_args()
+    main(use_batch_api=args.batch, full=args.full, heuristics=not args.no_heuristics)
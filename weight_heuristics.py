@@ -0,0 +1,129 @@
+import os
+import re
+import time
+
+import numpy as np
+
+from checkpoint import source_key
+from cvot_index import tokenize
+
+# --- Configuration ---
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;])\s+|\n\s*\n")  # Sentence ends, plus blank lines between table rows and headings
+PROXIMITY_WINDOW = 3  # Sentences either side in which a nearby mention still counts as evidence
+PROXIMITY_DECAY = 0.6  # Evidence multiplier per sentence of distance
+# Edges whose heuristic confidence falls in [low, high) are uncertain and go to the LLM; the rest keep the
+# heuristic weight. Confidence reaches 0.7 only when both descriptions are mostly stated in one sentence;
+# the default low bound of 0 sends everything else, including edges the text never mentions, to the LLM.
+HEURISTIC_BAND = tuple(float(bound) for bound in os.getenv("WEIGHT_HEURISTIC_BAND", "0.0,0.7").split(","))
+
+def split_sentences(text):
+    """Splits source text into sentences, each as a list of cvot_index terms."""
+    return [terms for terms in (tokenize(sentence) for sentence in SENTENCE_PATTERN.split(text)) if terms]
+
+def term_matrix(rows, vocabulary, values=None):
+    """A len(rows) x len(vocabulary) matrix with 1 (or values[term]) where a row contains a term."""
+    matrix = np.zeros((len(rows), len(vocabulary)), dtype=np.float32)
+    for i, terms in enumerate(rows):
+        columns = [vocabulary[term] for term in set(terms) if term in vocabulary]
+        matrix[i, columns] = 1.0 if values is None else values[columns]
+    return matrix
+
+def score_section(text, edges):
+    """
+    Scores (from_terms, to_terms) edges against one section's text, all at once. Returns a dict of
+    per-edge arrays:
+      cooccurrence - how fully both descriptions appear in one sentence (0-1)
+      proximity    - the same, allowing the two mentions to be a few sentences apart
+      grounding    - how fully the less-mentioned endpoint appears in any sentence
+      similarity   - TF-IDF cosine between the two descriptions
+    Coverage of a description in a sentence is the share of its IDF mass present there, so rare terms
+    (register names, error codes) count for more than generic words.
+    """
+    vocabulary = {}
+    for from_terms, to_terms in edges:
+        for term in (*from_terms, *to_terms):
+            vocabulary.setdefault(term, len(vocabulary))
+    sentences = split_sentences(text)
+    if not sentences or not vocabulary:
+        zeros = np.zeros(len(edges), dtype=np.float32)
+        return {"cooccurrence": zeros, "proximity": zeros, "grounding": zeros, "similarity": zeros}
+
+    presence = term_matrix(sentences, vocabulary)
+    idf = (np.log((1 + len(sentences)) / (1 + presence.sum(axis=0))) + 1).astype(np.float32)
+    from_tfidf = term_matrix([edge[0] for edge in edges], vocabulary, idf)
+    to_tfidf = term_matrix([edge[1] for edge in edges], vocabulary, idf)
+
+    # sentences x edges: share of each description's IDF mass present in each sentence
+    from_coverage = presence @ (from_tfidf / np.maximum(from_tfidf.sum(axis=1, keepdims=True), 1e-9)).T
+    to_coverage = presence @ (to_tfidf / np.maximum(to_tfidf.sum(axis=1, keepdims=True), 1e-9)).T
+
+    # Spread each 'to' mention over neighbouring sentences with decaying strength
+    nearby_to = to_coverage.copy()
+    for distance in range(1, min(PROXIMITY_WINDOW, len(sentences) - 1) + 1):
+        decayed = to_coverage * PROXIMITY_DECAY ** distance
+        np.maximum(nearby_to[distance:], decayed[:-distance], out=nearby_to[distance:])
+        np.maximum(nearby_to[:-distance], decayed[distance:], out=nearby_to[:-distance])
+
+    norms = np.linalg.norm(from_tfidf, axis=1) * np.linalg.norm(to_tfidf, axis=1)
+    return {
+        "cooccurrence": np.minimum(from_coverage, to_coverage).max(axis=0),
+        "proximity": np.minimum(from_coverage, nearby_to).max(axis=0),
+        "grounding": np.minimum(from_coverage.max(axis=0), to_coverage.max(axis=0)),
+        "similarity": (from_tfidf * to_tfidf).sum(axis=1) / np.maximum(norms, 1e-9),
+    }
+
+def combine_signals(signals):
+    """
+    Turns the signals into a provisional weight and the heuristic's confidence in it (both rounded, 0.1-1.0).
+    The weight is how closely the text ties the two descriptions (proximity, nudged by TF-IDF similarity);
+    the confidence is how explicitly it does so, which only a single-sentence statement of both endpoints
+    provides. Nearby mentions raise the weight but leave it to the LLM to confirm.
+    """
+    signals = {name: values.astype(np.float64) for name, values in signals.items()}  # So rounding yields clean 2-decimal floats
+    weight = 0.1 + 0.75 * signals["proximity"] + 0.15 * signals["similarity"]
+    confidence = np.sqrt(signals["grounding"] * signals["cooccurrence"])
+    return np.round(np.clip(weight, 0.1, 1.0), 2), np.round(np.clip(confidence, 0.1, 1.0), 2)
+
+def score_relationships(relationships, node_lookup, source_text_lookup):
+    """
+    Gives every relationship a provisional weight and confidence from the full source text of its
+    endpoints' sections. Returns (updates in the same shape as LLM weight updates, number of
+    relationships whose sections have no source text to score against).
+    """
+    by_section = {}
+    for position, rel in enumerate(relationships):
+        nodes = [node_lookup.get(node_id, {}) for node_id in (rel["from_id"], rel["to_id"])]
+        keys = tuple(dict.fromkeys(source_key(node.get("source_doc"), node["source_title"]) for node in nodes if node.get("source_title")))
+        by_section.setdefault(keys, []).append(position)
+
+    updates, without_text = [None] * len(relationships), 0
+    for keys, positions in by_section.items():
+        text = "\n\n".join(source_text_lookup.get(key, "") or "" for key in keys)
+        if not text.strip():
+            without_text += len(positions)
+        edges = [(tokenize(relationships[p]["from_desc"]), tokenize(relationships[p]["to_desc"])) for p in positions]
+        weights, confidences = combine_signals(score_section(text, edges))
+        for p, weight, confidence in zip(positions, weights.tolist(), confidences.tolist()):
+            updates[p] = {"from_id": relationships[p]["from_id"], "to_id": relationships[p]["to_id"],
+                          "weight": weight, "confidence": confidence, "analysis_type": "heuristic_text_analysis"}
+    return updates, without_text
+
+def triage_relationships(relationships, node_lookup, source_text_lookup, band=HEURISTIC_BAND):
+    """
+    Scores relationships locally and splits them into (settled updates, uncertain relationships).
+    Only the uncertain ones, whose heuristic confidence falls inside band, need an LLM call.
+    """
+    started = time.perf_counter()
+    low, high = band
+    settled, uncertain = [], []
+    updates, without_text = score_relationships(relationships, node_lookup, source_text_lookup)
+    for rel, update in zip(relationships, updates):
+        if low <= update["confidence"] < high:
+            uncertain.append(rel)
+        else:
+            settled.append(update)
+    print(f"  - Heuristic pre-pass scored {len(relationships)} relationships in {(time.perf_counter() - started) * 1000:.0f} ms: "
+          f"{len(settled)} settled, {len(uncertain)} uncertain (confidence in [{low}, {high})) left for the LLM.")
+    if without_text:
+        print(f"    - {without_text} relationships have no source text in the checkpoint to score against.")
+    return settled, uncertain